@@ -16,6 +16,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(project_root)
 
 from app.components.layout import setup_page
+from app.components.prefetch import prefetch_forecast
 from modules.attractions_api import fetch_attractions
 from modules.nlp_extractor import extract_entities
 from modules.rag_engine import ensure_index_for_city, index_exists
@@ -116,6 +117,8 @@ if generate:
             "duration": duration,
             "date": date,
         })
+        # Forecast is independent of the index build; fetch it in the background
+        prefetch_forecast(destination, date, duration)
 
     st.success(
         f"Destination: **{destination}** | Budget: **${budget}** | "
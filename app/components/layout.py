@@ -39,6 +39,7 @@ TRIP_SESSION_KEYS = (
     "selected_attractions",
     "weather_report",
     "forecast_days",
+    "forecast_future",
     "itinerary_generated",
     "itinerary_data",
 )
@@ -101,6 +102,13 @@ def _themes_dir():
     return os.path.join(_assets_dir(), "themes")
 
 
+@st.cache_resource(show_spinner=False)
+def _read_css(path: str) -> str:
+    """Read a stylesheet once per process instead of on every rerun."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
 def load_saved_theme() -> str:
     """Load persisted theme id from .streamlit/theme_pref.toml."""
     if not THEME_PREF_FILE.exists():
@@ -153,16 +161,14 @@ def load_css(theme_id: str | None = None):
 
     base_path = os.path.join(_assets_dir(), "style.css")
     try:
-        with open(base_path, "r", encoding="utf-8") as f:
-            css_parts.append(f.read())
+        css_parts.append(_read_css(base_path))
     except OSError as e:
         st.warning(f"Could not load base CSS: {e}")
 
     theme_file = THEMES.get(theme_id, THEMES["sunset"])["file"]
     theme_path = os.path.join(_themes_dir(), theme_file)
     try:
-        with open(theme_path, "r", encoding="utf-8") as f:
-            css_parts.append(f.read())
+        css_parts.append(_read_css(theme_path))
     except OSError as e:
         st.warning(f"Could not load theme CSS: {e}")
 
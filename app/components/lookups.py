@@ -0,0 +1,83 @@
+"""Per-trip cached lookups for the results page.
+
+Checkbox toggles rerun the page script, so the network-bound lookups are cached per
+trip. Failures (timeouts, rate limits, placeholders, empty rankings) are not cached,
+so the next rerun retries.
+"""
+
+import logging
+
+import streamlit as st
+
+from modules.attractions_api import fetch_attractions
+from modules.rag_engine import retrieve_for_trip
+from modules.weather_api import get_forecast_summary
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_TTL = 3600
+
+
+class _Uncached(Exception):
+    """Carries a failed lookup's result out of a cached function; st.cache_data never stores a raise."""
+
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+@st.cache_data(ttl=LOOKUP_TTL, show_spinner=False)
+def _forecast_if_ok(destination: str, date: str, duration_days: int) -> str:
+    report = get_forecast_summary(destination, date, duration_days)
+    if not report.startswith("Day "):
+        raise _Uncached(report)
+    return report
+
+
+def cached_forecast(destination: str, date: str, duration_days: int) -> str:
+    try:
+        return _forecast_if_ok(destination, date, duration_days)
+    except _Uncached as e:
+        return e.value
+
+
+@st.cache_data(ttl=LOOKUP_TTL, show_spinner=False)
+def _attractions_if_ok(destination: str) -> list[dict]:
+    attractions = fetch_attractions(destination)
+    if not attractions or attractions[0].get("name") == "No attractions found":
+        raise _Uncached(attractions)
+    return attractions
+
+
+def cached_attractions(destination: str) -> list[dict]:
+    try:
+        return _attractions_if_ok(destination)
+    except _Uncached as e:
+        return e.value
+
+
+@st.cache_data(ttl=LOOKUP_TTL, show_spinner=False)
+def _ranking_if_ok(user_query: str, destination: str, budget, duration, date: str) -> list[dict]:
+    try:
+        ranking = retrieve_for_trip(
+            user_query=user_query,
+            destination=destination,
+            budget=budget,
+            duration=duration,
+            date=date,
+            top_k=8,
+        )
+    except Exception as e:
+        logger.error("Ranking failed for %s: %s", destination, e)
+        raise _Uncached([]) from e
+    # Empty while the index is missing or embeddings failed; retry on the next rerun
+    if not ranking:
+        raise _Uncached([])
+    return ranking
+
+
+def cached_ranking(user_query: str, destination: str, budget, duration, date: str) -> list[dict]:
+    try:
+        return _ranking_if_ok(user_query, destination, budget, duration, date)
+    except _Uncached as e:
+        return e.value
@@ -0,0 +1,45 @@
+"""Background prefetch of trip data while the user moves between pages."""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from modules.weather_api import get_forecast_summary
+
+logger = logging.getLogger(__name__)
+
+FORECAST_FUTURE_KEY = "forecast_future"
+
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Process-wide worker pool for network prefetches."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
+def prefetch_forecast(destination: str, date: str, duration_days: int):
+    """Start fetching the forecast in the background and remember the future.
+
+    Attractions are not prefetched: Home fetches them in the foreground right after
+    this call, since the index build needs them, and fetch_attractions stores them
+    in the on-disk cache the Results page then reads.
+    """
+    future = get_executor().submit(get_forecast_summary, destination, date, duration_days)
+    st.session_state[FORECAST_FUTURE_KEY] = ((destination, date, duration_days), future)
+
+
+def take_prefetched_forecast(destination: str, date: str, duration_days: int) -> str | None:
+    """Return the prefetched forecast for this trip, waiting if still in flight."""
+    entry = st.session_state.pop(FORECAST_FUTURE_KEY, None)
+    if not entry:
+        return None
+    key, future = entry
+    if key != (destination, date, duration_days):
+        future.cancel()
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        logger.error("Forecast prefetch failed for %s: %s", destination, e)
+        return None
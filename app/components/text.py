@@ -0,0 +1,14 @@
+"""Plain-text cleanup for model output shown outside markdown."""
+
+import re
+
+# Heading hashes and blockquote markers only count at the start of a line, so
+# "#1 rated", "Gate #4" and "> $500" mid-sentence are left alone.
+LINE_MARKER_RE = re.compile(r"^[ \t]*(?:#{1,6}[ \t]+|>[ \t]*)", re.MULTILINE)
+# Paired emphasis or code spans (*x*, **x**, ***x***, `x`); the text inside is kept.
+EMPHASIS_RE = re.compile(r"(\*{1,3}|`+)(?=\S)(.+?)(?<=\S)\1")
+
+
+def strip_markdown(text: str) -> str:
+    """Remove markdown markup the model sometimes leaves in free-text notes."""
+    return EMPHASIS_RE.sub(r"\2", LINE_MARKER_RE.sub("", text))
@@ -16,9 +16,10 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..
 sys.path.append(project_root)
 
 from app.components.layout import render_trip_summary_bar, setup_page
-from modules.attractions_api import fetch_attractions
-from modules.rag_engine import index_exists, retrieve_for_trip
-from modules.weather_api import get_forecast_summary, parse_forecast_to_days
+from app.components.lookups import cached_attractions, cached_forecast, cached_ranking
+from app.components.prefetch import take_prefetched_forecast
+from modules.rag_engine import index_exists
+from modules.weather_api import parse_forecast_to_days
 
 
 def _display_name(name: str) -> str:
@@ -27,6 +28,7 @@ def _display_name(name: str) -> str:
         return "Unknown attraction"
     return re.sub(r"^\d+\.\s*", "", name.strip())
 
+
 setup_page("Travel Results", "📍", "preview")
 
 st.title("Your Travel Results")
@@ -52,7 +54,9 @@ except (TypeError, ValueError):
 st.markdown("### Weather Forecast")
 st.caption("OpenWeather provides a rolling 5-day forecast window from today.")
 with st.spinner("Fetching multi-day forecast..."):
-    weather_report = get_forecast_summary(destination, date, duration_days)
+    weather_report = take_prefetched_forecast(destination, date, duration_days)
+    if weather_report is None:
+        weather_report = cached_forecast(destination, date, duration_days)
     forecast_days = parse_forecast_to_days(weather_report, duration_days)
     st.session_state.weather_report = weather_report
     st.session_state.forecast_days = forecast_days
@@ -74,7 +78,7 @@ st.markdown("### Top Attractions")
 st.caption("Ranked by hybrid search (semantic + keyword + quality signals). Select places to include in your itinerary.")
 
 with st.spinner("Retrieving personalized attractions..."):
-    api_attractions = fetch_attractions(destination)
+    api_attractions = cached_attractions(destination)
     rag_results = []
     using_rag = st.session_state.get("rag_index_built", False)
 
@@ -85,14 +89,7 @@ with st.spinner("Retrieving personalized attractions..."):
         st.session_state.index_city = destination
 
     if using_rag:
-        rag_results = retrieve_for_trip(
-            user_query=user_query,
-            destination=destination,
-            budget=budget,
-            duration=duration,
-            date=date,
-            top_k=8,
-        )
+        rag_results = cached_ranking(user_query, destination, budget, duration, date)
 
     if rag_results:
         display_attractions = rag_results
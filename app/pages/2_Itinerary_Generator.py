@@ -1,11 +1,19 @@
-import json
+import asyncio
+import hashlib
 import logging
 import os
+import re
 import sys
-from datetime import datetime, timedelta
-
+import threading
+import time
+from datetime import date as date_obj, timedelta
+from functools import partial
+from pathlib import Path
+
+import fastjsonschema
+import orjson
 import streamlit as st
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAIError
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,11 +26,275 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..
 sys.path.append(project_root)
 
 from app.components.layout import render_trip_summary_bar, setup_page
-from config.config import OPENAI_API_KEY
+from app.components.text import strip_markdown
+from config.config import ITINERARY_CACHE_DIR, OPENAI_API_KEY
 from modules.rag_engine import retrieve_for_trip
 from modules.retrieval import check_grounding, format_sources_for_prompt
 from modules.weather_api import get_forecast_summary, parse_forecast_to_days
 
+LLM_MODEL = "gpt-4o"
+LLM_TIMEOUT = 30
+LLM_MAX_RETRIES = 3
+STREAM_FLUSH_SECONDS = 0.05
+ITINERARY_CACHE_TTL = 86400
+
+# Compact shape hint; response_format already enforces a JSON object.
+ITINERARY_JSON_FORMAT = (
+    '{"destination":str,"duration_days":int,"budget":float,"total_trip_spend":float,'
+    '"notes":"<weather and budget summary>","itinerary":[{"day_title":"Day 1: <title>",'
+    '"daily_spend":float,"date":"YYYY-MM-DD","activities":[{"time_slot":"Morning",'
+    '"activity":"<name and description>","cost":float}]}]}'
+)
+
+ITINERARY_SCHEMA = {
+    "type": "object",
+    "required": ["itinerary"],
+    "properties": {
+        "total_trip_spend": {"type": "number"},
+        "notes": {"type": "string"},
+        "itinerary": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["activities"],
+                "properties": {
+                    "day_title": {"type": "string"},
+                    "daily_spend": {"type": "number"},
+                    "activities": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "time_slot": {"type": "string"},
+                                "activity": {"type": "string"},
+                                "cost": {"type": "number"},
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+# Compile the validator once at import instead of per generation.
+_validate_itinerary = fastjsonschema.compile(ITINERARY_SCHEMA)
+
+# Matched as substrings, so "Late Morning" or "Early Afternoon (1pm)" get their icon too.
+SLOT_ICONS = {"morning": "☀️", "afternoon": "🌆", "evening": "🌙", "night": "🌙"}
+SLOT_DEFAULT_ICON = "🕒"
+
+TRIP_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})|([A-Za-z]+)\s+(\d{4})")
+MONTHS = {
+    name: i
+    for i, name in enumerate(
+        ("january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"),
+        1,
+    )
+}
+
+
+def _parse_start_date(value) -> date_obj:
+    """Parse a YYYY-MM-DD or 'Month YYYY' trip date; fall back to today."""
+    match = TRIP_DATE_RE.fullmatch(str(value or "").strip())
+    if match:
+        year, month, day, month_name, month_year = match.groups()
+        try:
+            if year:
+                return date_obj(int(year), int(month), int(day))
+            month_num = MONTHS.get(month_name.lower())
+            if month_num:
+                return date_obj(int(month_year), month_num, 1)
+        except ValueError:
+            pass
+    logger.warning("Invalid trip date %r, defaulting to today", value)
+    return date_obj.today()
+
+
+@st.cache_resource
+def _llm_runtime() -> tuple[asyncio.AbstractEventLoop, AsyncOpenAI]:
+    """Shared event loop thread and OpenAI client, reused across reruns.
+
+    The async client's connection pool is bound to the loop it first runs on,
+    so requests are always scheduled on this one long-lived loop.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+    client = AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+    )
+    return loop, client
+
+
+def _run_async(coro):
+    """Run a coroutine on the shared LLM loop and wait for its result."""
+    loop, _ = _llm_runtime()
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def _gather_blocking(*calls):
+    """Run blocking calls concurrently in worker threads; None entries yield None."""
+
+    async def _none():
+        return None
+
+    return await asyncio.gather(*(asyncio.to_thread(call) if call else _none() for call in calls))
+
+
+def _iter_llm(agen):
+    """Drive an async generator on the shared LLM loop as a sync iterator."""
+    loop, _ = _llm_runtime()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+async def _stream_itinerary(client: AsyncOpenAI, system_prompt: str, user_prompt: str):
+    """Stream the itinerary JSON text; the client retries the request with backoff."""
+    stream = await client.chat.completions.create(
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.7,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _completed_days(text: str) -> list[dict]:
+    """Return itinerary day objects whose closing brace has already streamed in."""
+    key = text.find('"itinerary"')
+    start = text.find("[", key) if key >= 0 else -1
+    if start < 0:
+        return []
+
+    days = []
+    depth = 0
+    obj_start = None
+    in_string = escaped = False
+    for i in range(start + 1, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            if depth == 0 and ch == "{":
+                obj_start = i
+            depth += 1
+        elif ch in "}]":
+            if depth == 0:
+                break
+            depth -= 1
+            if depth == 0 and obj_start is not None:
+                try:
+                    days.append(orjson.loads(text[obj_start:i + 1]))
+                except orjson.JSONDecodeError:
+                    pass
+                obj_start = None
+    return days
+
+
+def _render_streamed_days(text: str, container, shown: int) -> int:
+    """Show newly completed days in the progress container; return the count shown."""
+    days = _completed_days(text)
+    for day_plan in days[shown:]:
+        lines = [f"**{day_plan.get('day_title', 'Day')}**"]
+        for activity in day_plan.get("activities", []):
+            lines.append(f"- {activity.get('time_slot', 'Activity')}: {activity.get('activity', '')}")
+        container.markdown("\n".join(lines))
+    return max(shown, len(days))
+
+
+def _itinerary_cache_path(
+    destination: str, budget, duration_days: int, start_date_str: str, selected: list[dict], query: str
+) -> Path:
+    """Cache file for a trip, keyed on its details, the user's picks and their query.
+
+    The query is lowercased with whitespace collapsed, so only wording changes miss.
+    Weather and retrieved-source text stay out of the key, so a refreshed forecast
+    or re-ranked sources still hit the cache.
+    """
+    picks = "\0".join(sorted(a.get("name") or "" for a in selected))
+    normalized_query = " ".join(query.lower().split())
+    raw = "\0".join((
+        LLM_MODEL,
+        destination.strip().lower(),
+        str(budget),
+        str(duration_days),
+        start_date_str,
+        picks,
+        normalized_query,
+    ))
+    return ITINERARY_CACHE_DIR / f"{hashlib.sha256(raw.encode('utf-8')).hexdigest()}.json"
+
+
+def _load_cached_itinerary(path: Path) -> dict | None:
+    if not path.exists():
+        return None
+    try:
+        entry = orjson.loads(path.read_bytes())
+    except (orjson.JSONDecodeError, OSError) as e:
+        logger.error("Error loading itinerary cache %s: %s", path, e)
+        return None
+    if time.time() - entry.get("timestamp", 0) >= ITINERARY_CACHE_TTL:
+        path.unlink(missing_ok=True)
+        return None
+    return entry.get("data")
+
+
+def _prune_itinerary_cache():
+    """Delete cached itineraries older than the TTL so the directory doesn't grow forever."""
+    cutoff = time.time() - ITINERARY_CACHE_TTL
+    for path in ITINERARY_CACHE_DIR.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError as e:
+            logger.error("Error pruning itinerary cache %s: %s", path, e)
+
+
+def _save_cached_itinerary(path: Path, itinerary_data: dict):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(orjson.dumps({"timestamp": time.time(), "data": itinerary_data}))
+    except OSError as e:
+        logger.error("Error saving itinerary cache %s: %s", path, e)
+    _prune_itinerary_cache()
+
+
+@st.cache_data(show_spinner=False)
+def _build_downloads(itinerary_data: dict, destination: str, budget, start_date_str: str) -> tuple[bytes, str]:
+    """Serialize the itinerary once per result instead of on every rerun."""
+    start = date_obj.fromisoformat(start_date_str)
+    total_trip_spend = float(itinerary_data.get("total_trip_spend", 0.0))
+    parts = [f"ITINERARY FOR {destination}\nBudget: ${budget}\nSpend: ${total_trip_spend:.2f}\n\n"]
+    for day_index, day_plan in enumerate(itinerary_data.get("itinerary", [])):
+        day_date = (start + timedelta(days=day_index)).strftime("%B %d, %Y")
+        parts.append(f"--- {day_plan.get('day_title', '')} ({day_date}) ---\n")
+        parts.extend(
+            f"{activity.get('time_slot')}: {activity.get('activity')} (${activity.get('cost', 0.0):.2f})\n"
+            for activity in day_plan.get("activities", [])
+        )
+        parts.append("\n")
+    return orjson.dumps(itinerary_data, option=orjson.OPT_INDENT_2), "".join(parts)
+
+
 setup_page("AI Itinerary Generator", "🧳", "itinerary")
 
 if "destination" not in st.session_state:
@@ -41,10 +313,7 @@ try:
 except (TypeError, ValueError):
     duration_days = 3 if not (isinstance(duration, str) and "week" in duration.lower()) else 5
 
-try:
-    start_date = datetime.strptime(date, "%Y-%m-%d").date()
-except ValueError:
-    start_date = datetime.now().date()
+start_date = _parse_start_date(date)
 start_date_str = start_date.strftime("%Y-%m-%d")
 
 st.title(f"{duration_days}-Day Itinerary for {destination}")
@@ -55,7 +324,7 @@ if not OPENAI_API_KEY:
     st.error("OpenAI API key is missing.")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+_, client = _llm_runtime()
 
 st.markdown("### Generate Your Itinerary")
 st.caption("Click below to fetch weather, retrieve attractions, and generate your plan.")
@@ -65,23 +334,27 @@ if selected_attractions:
 else:
     st.warning("No attractions selected. Retrieval will use all indexed attractions.")
 
-generate = st.button("Generate Itinerary", type="primary")
+generate_col, regenerate_col = st.columns(2)
+generate = generate_col.button("Generate Itinerary", type="primary")
+# A cached plan is replayed for a day; this asks the model for a fresh one instead
+regenerate = regenerate_col.button("Generate a New Plan")
 
-if generate:
+if generate or regenerate:
     weather_report = st.session_state.get("weather_report")
     forecast_days = st.session_state.get("forecast_days")
 
     with st.status("Building your itinerary...", expanded=True) as status:
+        # Weather and retrieval are independent blocking calls; overlap them on the LLM loop.
+        weather_call = None
         if not weather_report:
             status.write("Fetching weather forecast...")
-            weather_report = get_forecast_summary(destination, start_date_str, duration_days)
-            forecast_days = parse_forecast_to_days(weather_report, duration_days)
-            st.session_state.weather_report = weather_report
-            st.session_state.forecast_days = forecast_days
+            weather_call = partial(get_forecast_summary, destination, start_date_str, duration_days)
 
         status.write("Retrieving attractions via hybrid RAG...")
+        places_call = None
         if st.session_state.get("rag_index_built"):
-            top_places = retrieve_for_trip(
+            places_call = partial(
+                retrieve_for_trip,
                 user_query=user_query,
                 destination=destination,
                 budget=budget,
@@ -90,8 +363,14 @@ if generate:
                 top_k=8,
                 selected_attractions=selected_attractions or None,
             )
-        else:
-            top_places = selected_attractions
+
+        fetched_weather, fetched_places = _run_async(_gather_blocking(weather_call, places_call))
+        top_places = fetched_places if places_call else selected_attractions
+        if weather_call:
+            weather_report = fetched_weather
+            forecast_days = parse_forecast_to_days(weather_report, duration_days)
+            st.session_state.weather_report = weather_report
+            st.session_state.forecast_days = forecast_days
 
         sources_text = format_sources_for_prompt(top_places)
         st.session_state.rag_sources = top_places
@@ -117,48 +396,41 @@ Rules:
 Numbered attraction sources (use these):
 {sources_text}
 
-JSON format:
-{{
-  "destination": "{destination}",
-  "duration_days": {duration_days},
-  "budget": {budget},
-  "total_trip_spend": <float>,
-  "notes": "<summary including weather and budget check>",
-  "itinerary": [
-    {{
-      "day_title": "Day 1: <title>",
-      "daily_spend": <float>,
-      "date": "{start_date_str}",
-      "activities": [
-        {{"time_slot": "Morning", "activity": "<name and description>", "cost": <float>}},
-        {{"time_slot": "Afternoon", "activity": "<name and description>", "cost": <float>}},
-        {{"time_slot": "Evening", "activity": "<name and description>", "cost": <float>}}
-      ]
-    }}
-  ]
-}}"""
+JSON format (one activity each for Morning, Afternoon, Evening):
+{ITINERARY_JSON_FORMAT}"""
 
         user_prompt = (
             f"Generate a {duration_days}-day itinerary for {destination} "
             f"starting {start_date_str} with a ${budget} budget."
         )
 
+        cache_path = _itinerary_cache_path(
+            destination, budget, duration_days, start_date_str, selected_attractions, user_query
+        )
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7,
-            )
-            itinerary_data = json.loads(response.choices[0].message.content)
+            itinerary_data = None if regenerate else _load_cached_itinerary(cache_path)
+            if itinerary_data is None:
+                preview = st.container()
+                parts = []
+                shown = 0
+                last_flush = 0.0
+                for piece in _iter_llm(_stream_itinerary(client, system_prompt, user_prompt)):
+                    parts.append(piece)
+                    now = time.monotonic()
+                    if now - last_flush >= STREAM_FLUSH_SECONDS:
+                        last_flush = now
+                        shown = _render_streamed_days("".join(parts), preview, shown)
+                itinerary_data = orjson.loads("".join(parts))
+                _validate_itinerary(itinerary_data)
+                _save_cached_itinerary(cache_path, itinerary_data)
+            else:
+                logger.info("Cache hit for itinerary: %s", destination)
             st.session_state.itinerary_data = itinerary_data
             st.session_state.itinerary_generated = True
             status.update(label="Itinerary generated!", state="complete")
-        except Exception as e:
+        except (OpenAIError, orjson.JSONDecodeError, fastjsonschema.JsonSchemaException) as e:
             logger.error("LLM generation failed: %s", e)
+            status.update(label="Generation failed", state="error")
             st.error(f"Generation failed: {e}")
             st.stop()
 
@@ -181,15 +453,17 @@ if st.session_state.get("itinerary_data"):
 
     with st.expander("Sources used (RAG retrieval)", expanded=False):
         if top_places:
+            source_lines = []
             for i, src in enumerate(top_places, 1):
-                st.markdown(
+                source_lines.append(
                     f"**{i}. {src.get('name', 'Unknown')}** — "
                     f"{src.get('category', 'N/A')} | "
                     f"Rating: {src.get('rating', 'N/A')} | "
                     f"{src.get('match_reason', '')}"
                 )
                 if src.get("link"):
-                    st.caption(src["link"])
+                    source_lines.append(f":gray[{src['link']}]")
+            st.markdown("\n\n".join(source_lines))
         else:
             st.write("No RAG sources available for this trip.")
 
@@ -206,48 +480,42 @@ if st.session_state.get("itinerary_data"):
 
         with st.container(border=True):
             st.subheader(day_plan.get("day_title", f"Day {day_index + 1}"))
-            st.markdown(
+            # One markdown element per day keeps the number of delta messages small
+            lines = [
                 f"**Date:** {day_date_str} | **Daily spend:** "
                 f"${day_plan.get('daily_spend', 0.0):.2f} | **Weather:** {weather_info}"
-            )
+            ]
             for activity in day_plan.get("activities", []):
                 slot = activity.get("time_slot", "Activity")
-                icon = "☀️" if "Morning" in slot else ("🌆" if "Afternoon" in slot else "🌙")
-                st.markdown(
+                slot_lower = slot.lower()
+                icon = next(
+                    (icon for name, icon in SLOT_ICONS.items() if name in slot_lower),
+                    SLOT_DEFAULT_ICON,
+                )
+                lines.append(
                     f"**{icon} {slot}** — {activity.get('activity', '')} "
                     f"(${activity.get('cost', 0.0):.2f})"
                 )
+            st.markdown("\n\n".join(lines))
 
     st.markdown("### Summary")
-    notes = itinerary_data.get("notes", "").replace("*", "")
+    notes = strip_markdown(itinerary_data.get("notes") or "")
     st.info(notes or "No additional notes.")
 
-    download_json = json.dumps(itinerary_data, indent=2)
+    download_json, download_text = _build_downloads(itinerary_data, destination, budget, start_date_str)
     st.download_button(
         "Download Itinerary (JSON)",
         data=download_json,
         file_name=f"{destination}_itinerary.json",
         mime="application/json",
+        key="download_itinerary_json",
     )
-
-    download_text = (
-        f"ITINERARY FOR {destination}\nBudget: ${budget}\nSpend: ${total_trip_spend:.2f}\n\n"
-    )
-    for day_index, day_plan in enumerate(day_plans):
-        day_date = (start_date + timedelta(days=day_index)).strftime("%B %d, %Y")
-        download_text += f"--- {day_plan.get('day_title', '')} ({day_date}) ---\n"
-        for activity in day_plan.get("activities", []):
-            download_text += (
-                f"{activity.get('time_slot')}: {activity.get('activity')} "
-                f"(${activity.get('cost', 0.0):.2f})\n"
-            )
-        download_text += "\n"
-
     st.download_button(
         "Download Itinerary (Plain Text)",
         data=download_text,
         file_name=f"{destination}_itinerary.txt",
         mime="text/plain",
+        key="download_itinerary_text",
     )
 
 st.page_link("pages/1_Travel_Results.py", label="Back to Results")
@@ -1,6 +1,8 @@
 import os
 import re
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 
 from dotenv import load_dotenv
 
@@ -28,12 +30,19 @@ META_FILE = DATA_DIR / "attraction_meta.json"
 
 WEATHER_COUNTER_FILE = DATA_DIR / "api_usage.txt"
 WEATHER_CACHE_FILE = DATA_DIR / "weather_cache.json"
+WEATHER_GEOCODE_CACHE_FILE = DATA_DIR / "geocode_cache.json"
+ITINERARY_CACHE_DIR = DATA_DIR / "llm_cache"
 
 RAPIDAPI_HOST = "travel-advisor.p.rapidapi.com"
 OPENWEATHER_ENDPOINT = "https://api.openweathermap.org/data/2.5/forecast"
 OPENWEATHER_ENDPOINT_CORD = "https://api.openweathermap.org/geo/1.0/direct"
+OPENWEATHER_ENDPOINT_CURRENT = "https://api.openweathermap.org/data/2.5/weather"
 
 EMBEDDING_MODEL = "text-embedding-3-small"
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "64"))
+# Per-city searches are tiny, so OpenMP threads cost more than they save; concurrent
+# sessions are the parallelism. Raise this only for bulk offline index builds.
+FAISS_THREADS = int(os.getenv("FAISS_THREADS", "1"))
 APP_NAME = "AI Travel Planner"
 
 VALID_UI_THEMES = ("ocean", "sunset", "minimal", "tropical")
@@ -49,14 +58,15 @@ def city_slug(city: str) -> str:
     return slug.strip("-") or "unknown"
 
 
-def get_index_paths(city: str) -> dict:
-    """Return per-city index file paths."""
+@lru_cache(maxsize=128)
+def get_index_paths(city: str) -> MappingProxyType:
+    """Return per-city index file paths (resolved once per city, read-only)."""
     city_dir = INDEXES_DIR / city_slug(city)
-    return {
+    return MappingProxyType({
         "dir": city_dir,
         "index": city_dir / "faiss_index.bin",
         "meta": city_dir / "attraction_meta.json",
         "embeddings": city_dir / "attraction_embeddings.npy",
         "embeddings_cache": city_dir / "embeddings_cache.json",
         "manifest": city_dir / "manifest.json",
-    }
+    })
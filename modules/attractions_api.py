@@ -1,7 +1,16 @@
 import requests
+import atexit
 import os
-import json
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config.config import CACHE_FILE, COUNTER_FILE, GEOID_CACHE_FILE, RAPIDAPI_HOST, RAPIDAPI_KEY
 
 CACHE_FILE = str(CACHE_FILE)
@@ -19,103 +28,194 @@ logging.basicConfig(
 # Create a logger for this module
 logger = logging.getLogger(__name__)
 
+# In-memory RapidAPI call count, loaded from COUNTER_FILE on first use
+_api_count = None
+COUNTER_FLUSH_EVERY = 5
+_api_count_lock = threading.Lock()
+
+# Serializes load-modify-save of the JSON caches when fetching in parallel
+_cache_write_lock = threading.Lock()
+FETCH_MANY_WORKERS = 8
+
+# Keys that mark a dict as an attraction card in unrecognized response shapes
+CARD_KEYS = frozenset(("cardTitle", "cardPhoto", "bubbleRating", "listSingleCardContent"))
+
+# Shared keep-alive session so consecutive RapidAPI calls reuse one TLS connection.
+# Retries keep urllib3's idempotent-only default: the RapidAPI calls are POSTs, and a
+# retried POST is billed without _increment_api_counter seeing it.
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    "x-rapidapi-key": RAPIDAPI_KEY,
+    "x-rapidapi-host": RAPIDAPI_HOST,
+    "Content-Type": "application/json",
+})
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+    ),
+)
+
+# geoIds never change for a city; failures are not memoized so they can be retried
+_geo_id_memo = {}
+
+# Cities whose live lookup failed, by wall-clock time, persisted under this reserved
+# key of GEOID_CACHE_FILE so retries don't burn quota, even across restarts
+GEOID_MISSES_KEY = "__misses__"
+GEOID_MISS_TTL = 3600
+
+def _set_geo_id_miss(city, missed_at):
+    """Return the geoId cache with `city`'s miss recorded, or cleared when missed_at is None.
+
+    Expired misses are dropped on the way. Call with _cache_write_lock held and save the result.
+    """
+    geo_cache = _load_cache(GEOID_CACHE_FILE)
+    cutoff = time.time() - GEOID_MISS_TTL
+    misses = {c: t for c, t in (geo_cache.get(GEOID_MISSES_KEY) or {}).items() if t >= cutoff}
+    if missed_at is None:
+        misses.pop(city, None)
+    else:
+        misses[city] = missed_at
+    geo_cache[GEOID_MISSES_KEY] = misses
+    return geo_cache
+
+def _record_geo_id_miss(city):
+    """Persist a failed lookup so it is skipped for GEOID_MISS_TTL."""
+    with _cache_write_lock:
+        _save_cache(GEOID_CACHE_FILE, _set_geo_id_miss(city, time.time()))
+
 # ---------- Counter Helpers ----------
 def _get_api_count():
-    logger.debug(f"Reading API counter from {COUNTER_FILE}")
+    logger.debug("Reading API counter from %s", COUNTER_FILE)
     if os.path.exists(COUNTER_FILE):
         try:
             with open(COUNTER_FILE, "r") as f:
                 count = int(f.read().strip())
-                logger.debug(f"API counter value: {count}")
+                logger.debug("API counter value: %s", count)
                 return count
         except ValueError as e:
-            logger.error(f"❌ Failed to parse API counter: {e}")
+            logger.error("❌ Failed to parse API counter: %s", e)
             return 0
-    logger.debug(f"Counter file {COUNTER_FILE} does not exist")
+    logger.debug("Counter file %s does not exist", COUNTER_FILE)
     return 0
 
-def _increment_api_counter():
-    logger.debug(f"Incrementing API counter in {COUNTER_FILE}")
+def _flush_api_counter(count=None):
+    """Write the counter via a temp file so a crash never leaves it truncated."""
+    if count is None:
+        count = _api_count
+    if count is None:
+        return
+    logger.debug("Flushing API counter %s to %s", count, COUNTER_FILE)
     try:
-        os.makedirs("data", exist_ok=True)
-        count = _get_api_count() + 1
-        with open(COUNTER_FILE, "w") as f:
-            f.write(str(count))
-        logger.debug(f"API counter incremented to {count}")
-        return count
+        _atomic_write(COUNTER_FILE, str(count).encode())
     except Exception as e:
-        logger.error(f"❌ Error incrementing API counter: {e}")
-        return _get_api_count()
+        logger.error("❌ Error flushing API counter: %s", e)
+
+def _increment_api_counter():
+    """Increment the in-memory counter; persist every COUNTER_FLUSH_EVERY calls."""
+    global _api_count
+    with _api_count_lock:
+        if _api_count is None:
+            _api_count = _get_api_count()
+        _api_count += 1
+        count = _api_count
+        if count % COUNTER_FLUSH_EVERY == 0:
+            _flush_api_counter(count)
+    logger.debug("API counter incremented to %s", count)
+    return count
+
+atexit.register(_flush_api_counter)
 
 # ---------- Cache Helpers ----------
+@lru_cache(maxsize=8)
+def _read_cache_file(file_path, mtime_ns):
+    """Parse a cache file; memoized per (path, mtime) so unchanged files parse once."""
+    with open(file_path, "rb") as f:
+        content = f.read().strip()
+    if not content:
+        logger.warning("⚠️ Cache file %s is empty", file_path)
+        return {}
+    return orjson.loads(content)
+
 def _load_cache(file_path):
-    logger.debug(f"Loading cache from {file_path}")
+    logger.debug("Loading cache from %s", file_path)
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r") as f:
-                content = f.read().strip()
-                if not content:
-                    logger.warning(f"⚠️ Cache file {file_path} is empty")
-                    return {}
-                cache = json.loads(content)
-                logger.debug(f"Cache loaded successfully from {file_path}")
-                return cache
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Failed to parse cache file {file_path}: {e}")
+            cache = _read_cache_file(file_path, os.stat(file_path).st_mtime_ns)
+            logger.debug("Cache loaded successfully from %s", file_path)
+            # Callers mutate the result before saving; keep the memoized dict intact
+            return dict(cache)
+        except orjson.JSONDecodeError as e:
+            logger.error("❌ Failed to parse cache file %s: %s", file_path, e)
             return {}
         except Exception as e:
-            logger.error(f"❌ Error loading cache file {file_path}: {e}")
+            logger.error("❌ Error loading cache file %s: %s", file_path, e)
             return {}
-    logger.debug(f"Cache file {file_path} does not exist")
+    logger.debug("Cache file %s does not exist", file_path)
     return {}
 
+def _atomic_write(file_path, payload: bytes):
+    """Write bytes to a temp file and swap it in, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, file_path)
+
 def _save_cache(file_path, data):
-    logger.debug(f"Saving cache to {file_path}")
+    logger.debug("Saving cache to %s", file_path)
     try:
-        os.makedirs("data", exist_ok=True)
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=4)
-        logger.info(f"✅ Cache saved to {file_path}")
+        _atomic_write(file_path, orjson.dumps(data))
+        _read_cache_file.cache_clear()
+        logger.info("✅ Cache saved to %s", file_path)
     except Exception as e:
-        logger.error(f"❌ Error saving cache to {file_path}: {e}")
+        logger.error("❌ Error saving cache to %s: %s", file_path, e)
 
 # ======================================================
 # ============== GEO ID FETCH & CACHE ==================
 # ======================================================
 def get_geo_id(city: str):
     """Fetch and cache the TripAdvisor geoId for a given city."""
-    logger.info(f"⚡ Fetching geoId for {city}")
+    logger.info("⚡ Fetching geoId for %s", city)
+    # --- Step 0: In-process memo (only successful lookups are kept) ---
+    if city in _geo_id_memo:
+        return _geo_id_memo[city]
+
     geo_cache = _load_cache(GEOID_CACHE_FILE)
 
     # --- Step 1: Return from cache if exists ---
     if city in geo_cache:
-        logger.info(f"✅ Using cached geoId for {city}: {geo_cache[city]}")
+        logger.info("✅ Using cached geoId for %s: %s", city, geo_cache[city])
+        _geo_id_memo[city] = geo_cache[city]
         return geo_cache[city]
 
-    # --- Step 2: Live API Call ---
+    # --- Step 2: Skip cities whose live lookup failed recently ---
+    missed_at = (geo_cache.get(GEOID_MISSES_KEY) or {}).get(city)
+    if missed_at is not None and time.time() - missed_at < GEOID_MISS_TTL:
+        logger.info("⏭️ Skipping geoId lookup for %s: failed within the last %ss", city, GEOID_MISS_TTL)
+        return None
+
+    # --- Step 3: Live API Call ---
     url = f"https://{RAPIDAPI_HOST}/locations/v2/search"
-    headers = {
-        "x-rapidapi-key": RAPIDAPI_KEY,
-        "x-rapidapi-host": RAPIDAPI_HOST,
-        "Content-Type": "application/json",
-    }
     payload = {"query": city, "updateToken": ""}
 
     try:
         count = _increment_api_counter()
-        logger.info(f"📊 RapidAPI call #{count} → locations/v2/search")
+        logger.info("📊 RapidAPI call #%s → locations/v2/search", count)
         if count > 480:
-            logger.warning(f"⚠️ Approaching monthly RapidAPI quota! Avoiding further live calls.")
+            logger.warning("⚠️ Approaching monthly RapidAPI quota! Avoiding further live calls.")
             return None
 
-        logger.debug(f"Making API request to {url}")
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        logger.debug("Making API request to %s", url)
+        response = _SESSION.post(url, json=payload, timeout=10)
         if response.status_code != 200:
-            logger.error(f"❌ Failed to get geoId ({response.status_code}): {response.text}")
+            logger.error("❌ Failed to get geoId (%s): %s", response.status_code, response.text)
+            _record_geo_id_miss(city)
             return None
 
-        data = response.json()
-        logger.debug(f"API response received for geoId search")
+        data = orjson.loads(response.content)
+        logger.debug("API response received for geoId search")
         results = (
             data.get("data", {})
             .get("AppPresentation_queryAppSearch", {})
@@ -123,52 +223,58 @@ def get_geo_id(city: str):
         )
 
         if not results:
-            logger.warning(f"⚠️ No results found for city: {city}")
+            logger.warning("⚠️ No results found for city: %s", city)
+            _record_geo_id_miss(city)
             return None
 
         geo_id = None
         for item in results:
-            logger.debug(f"Processing item for geoId: {item.get('__typename', 'N/A')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Processing item for geoId: %s", item.get('__typename', 'N/A'))
             geo_id = find_first_numeric_geoid(item)
             if geo_id is not None and geo_id != "":
                 break
 
         if not geo_id:
-            logger.warning(f"⚠️ No geoId found for {city}")
+            logger.warning("⚠️ No geoId found for %s", city)
+            _record_geo_id_miss(city)
             return None
 
-        # Cache and return
-        geo_cache[city] = geo_id
-        _save_cache(GEOID_CACHE_FILE, geo_cache)
-        logger.info(f"✅ Found and cached geoId {geo_id} for city: {city}")
+        # Cache and return (re-read under the lock so parallel lookups don't drop entries)
+        with _cache_write_lock:
+            geo_cache = _set_geo_id_miss(city, None)
+            geo_cache[city] = geo_id
+            _save_cache(GEOID_CACHE_FILE, geo_cache)
+        _geo_id_memo[city] = geo_id
+        logger.info("✅ Found and cached geoId %s for city: %s", geo_id, city)
         return geo_id
 
     except Exception as e:
-        logger.error(f"❌ Error fetching geoId for {city}: {e}")
+        logger.error("❌ Error fetching geoId for %s: %s", city, e)
+        _record_geo_id_miss(city)
         return None
 
 def find_first_numeric_geoid(data):
+    """Depth-first search for the first numeric geoId, using an explicit stack."""
     logger.debug("Searching for numeric geoId")
-    if isinstance(data, dict):
-        if 'geoId' in data:
-            value = data['geoId']
+    stack = deque([data])
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            value = node.get('geoId')
             if value is not None:
+                if isinstance(value, int):
+                    return value
                 try:
                     geo_id = int(value)
-                    logger.debug(f"Found numeric geoId: {geo_id}")
+                    logger.debug("Found numeric geoId: %s", geo_id)
                     return geo_id
-                except ValueError:
-                    logger.debug(f"Skipping non-numeric geoId: {value}")
-                    pass
-        for value in data.values():
-            result = find_first_numeric_geoid(value)
-            if result is not None:
-                return result
-    elif isinstance(data, list):
-        for item in data:
-            result = find_first_numeric_geoid(item)
-            if result is not None:
-                return result
+                except (TypeError, ValueError):
+                    logger.debug("Skipping non-numeric geoId: %s", value)
+            # Reversed so children are visited in document order; leaves can't hold a geoId
+            stack.extend(v for v in reversed(node.values()) if isinstance(v, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(v for v in reversed(node) if isinstance(v, (dict, list)))
     logger.debug("No numeric geoId found")
     return None
 
@@ -177,24 +283,18 @@ def find_first_numeric_geoid(data):
 # ======================================================
 def fetch_attractions(city: str, limit: int = 10):
     """Fetch and cache top attractions for a given city."""
-    logger.info(f"⚡ Fetching attractions for {city}")
+    logger.info("⚡ Fetching attractions for %s", city)
     cache = _load_cache(CACHE_FILE)
     if city in cache:
-        logger.info(f"✅ Using cached attractions for {city}")
+        logger.info("✅ Using cached attractions for %s", city)
         return cache[city]
 
     geo_id = get_geo_id(city)
     if not geo_id:
-        logger.warning(f"⚠️ Could not fetch attractions for {city} (missing geoId). Using cached data if available.")
+        logger.warning("⚠️ Could not fetch attractions for %s (missing geoId). Using cached data if available.", city)
         return cache.get(city, [{"name": "No attractions found", "description": "N/A"}])
 
     url = f"https://{RAPIDAPI_HOST}/attractions/v2/list"
-    headers = {
-        "x-rapidapi-key": RAPIDAPI_KEY,
-        "x-rapidapi-host": RAPIDAPI_HOST,
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "geoId": geo_id,
         "pax": [{"ageBand": "ADULT", "count": 2}],
@@ -208,40 +308,172 @@ def fetch_attractions(city: str, limit: int = 10):
 
     try:
         count = _increment_api_counter()
-        logger.info(f"📊 RapidAPI call #{count} → attractions/v2/list")
+        logger.info("📊 RapidAPI call #%s → attractions/v2/list", count)
         if count > 480:
-            logger.warning(f"⚠️ Approaching monthly RapidAPI quota! Returning cached data.")
+            logger.warning("⚠️ Approaching monthly RapidAPI quota! Returning cached data.")
             return cache.get(city, [{"name": "No attractions found", "description": "N/A"}])
 
-        logger.debug(f"Making API request to {url}")
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
+        logger.debug("Making API request to %s", url)
+        response = _SESSION.post(url, json=payload, timeout=15)
         if response.status_code != 200:
-            logger.error(f"❌ Error fetching attractions: Status Code {response.status_code}, Response: {response.text}")
+            logger.error("❌ Error fetching attractions: Status Code %s, Response: %s", response.status_code, response.text)
             return [{"name": "No attractions found", "description": "N/A"}]
 
-        data = response.json()
-        logger.debug(f"API response received for attractions")
+        data = orjson.loads(response.content)
+        logger.debug("API response received for attractions")
         attractions = parse_attractions_from_response(data, limit=limit)
-        logger.debug(f"Parsed {len(attractions)} attractions")
+        logger.debug("Parsed %s attractions", len(attractions))
 
         if not attractions:
-            logger.warning(f"⚠️ No attractions found for {city}")
+            logger.warning("⚠️ No attractions found for %s", city)
             attractions = [{"name": "No attractions found", "description": "N/A"}]
-        else:
-            attractions = attractions[:limit]
 
-        logger.info(f"🆕 New city detected: {city}. Caching data.")
-        updated_cache = _load_cache(CACHE_FILE)
-        updated_cache[city] = attractions
-        _save_cache(CACHE_FILE, updated_cache)
+        logger.info("🆕 New city detected: %s. Caching data.", city)
+        with _cache_write_lock:
+            cache = _load_cache(CACHE_FILE)
+            cache[city] = attractions
+            _save_cache(CACHE_FILE, cache)
 
-        logger.info(f"✅ Fetched and cached {len(attractions)} attractions for {city}")
+        logger.info("✅ Fetched and cached %s attractions for %s", len(attractions), city)
         return attractions
 
     except Exception as e:
-        logger.error(f"❌ Error fetching attractions for {city}: {e}")
+        logger.error("❌ Error fetching attractions for %s: %s", city, e)
         return [{"name": "No attractions found", "description": "N/A"}]
 
+def fetch_attractions_many(cities, limit: int = 10):
+    """Fetch attractions for several cities concurrently; returns {city: attractions}."""
+    unique = list(dict.fromkeys(cities))
+    logger.info("⚡ Fetching attractions for %s cities in parallel", len(unique))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(FETCH_MANY_WORKERS, len(unique))) as ex:
+        results = ex.map(lambda c: fetch_attractions(c, limit=limit), unique)
+        return dict(zip(unique, results))
+
+def _fast_app_list_cards(data):
+    """Cards from the usual data.AppPresentation_queryAppListV2[0].sections[].items[] shape.
+
+    Plain indexing with no per-level type checks. Only taken when every section has
+    items and every item has listSingleCardContent; anything else (appSearchCardContent
+    cards, bare items, list/cardItems sections) yields [] so _app_list_cards sees the
+    whole response and no attraction is dropped.
+    """
+    cards = []
+    try:
+        for sec in data["AppPresentation_queryAppListV2"][0]["sections"]:
+            items = sec["items"]
+            if not items:
+                return []
+            for item in items:
+                card = item.get("listSingleCardContent")
+                if not card:
+                    return []
+                cards.append(card)
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return []
+    return cards
+
+def _app_list_cards(data):
+    """Yield raw cards from the AppPresentation_queryAppListV2 response shape."""
+    app_list = data.get("AppPresentation_queryAppListV2")
+    if not app_list or not isinstance(app_list, list):
+        return
+    for sec in app_list[0].get("sections") or []:
+        if isinstance(sec, dict):
+            items = sec.get("items") or sec.get("list", []) or sec.get("cardItems") or []
+            if items and isinstance(items, list):
+                for item in items:
+                    yield item.get("listSingleCardContent") or item.get("appSearchCardContent") or item
+            else:
+                yield sec.get("listSingleCardContent") or sec
+
+def _section_cards(data):
+    """Yield raw cards from the flat data.sections / data.results shape."""
+    sections = data.get("sections") or data.get("results") or []
+    if not isinstance(sections, list):
+        return
+    for block in sections:
+        if isinstance(block, dict):
+            items = block.get("items") or block.get("cards") or block.get("list") or []
+            if isinstance(items, list) and items:
+                for it in items:
+                    yield it.get("listSingleCardContent") or it.get("appSearchCardContent") or it
+            else:
+                yield block.get("listSingleCardContent") or block
+
+def _scanned_cards(resp_json):
+    """Yield anything that looks like a card, walking the response iteratively in document order."""
+    stack = deque([resp_json])
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if not CARD_KEYS.isdisjoint(node):
+                yield node.get("listSingleCardContent") or node
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+_EMPTY = {}
+
+def _child(d, key):
+    """Return d[key] when it is a dict, else a shared empty dict (so .get chains never fail)."""
+    value = d.get(key)
+    return value if isinstance(value, dict) else _EMPTY
+
+def _normalize_card(card):
+    """Map one raw card to the normalized attraction dict."""
+    card_title = _child(card, "cardTitle")
+    bubble = _child(card, "bubbleRating")
+    card_photo = _child(card, "cardPhoto")
+    photo_info = _child(card, "photo")
+    card_link = _child(card, "cardLink")
+    title = card.get("title")
+
+    name = (
+        card_title.get("string")
+        or (title if isinstance(title, str) else None)
+        or card.get("name")
+        or card.get("localizedName")
+        or _child(card, "title").get("string")
+    ) or "Unknown"
+    logger.debug("Normalizing card: %s", name)
+
+    rating = bubble.get("rating") or card.get("rating") or "N/A"
+    reviews = _child(bubble, "numberReviews").get("string") or card.get("reviewCount") or ""
+    if isinstance(reviews, str):
+        reviews = reviews.replace("(", "").replace(")", "").strip()
+
+    category = _child(card, "primaryInfo").get("text") or _child(card, "category").get("name") or card.get("category") or "N/A"
+
+    # Updated image parsing for larger images
+    photo_sizes = _child(card_photo, "sizes") or _child(photo_info, "sizes")
+    photo = _child(photo_sizes, "large").get("url") or _child(photo_sizes, "medium").get("url") or _child(photo_sizes, "small").get("url") or ""
+    if not photo:
+        url_template = _child(card_photo, "sizes").get("urlTemplate") or _child(card_photo, "photo").get("url") or photo_info.get("url") or ""
+        if url_template and "{width}" in url_template:
+            photo = url_template.replace("{width}", "400").replace("{height}", "300")
+
+    route = card_link.get("route")
+    if isinstance(route, dict):
+        url_part = route.get("url") or route.get("nonCanonicalUrl") or ""
+        link = "https://www.tripadvisor.com" + url_part if url_part else ""
+    else:
+        link = card.get("detailPageUrl") or card_link.get("url") or ""
+
+    desc = _child(card, "descriptiveText").get("text") or _child(card, "content").get("description") or card.get("snippet") or ""
+
+    return {
+        "name": name,
+        "description": desc or "N/A",
+        "category": category,
+        "rating": rating,
+        "reviews": reviews,
+        "photo": photo,
+        "link": link,
+    }
+
 def parse_attractions_from_response(resp_json, limit=10):
     """
     Universal parser for TripAdvisor attractions responses.
@@ -250,128 +482,45 @@ def parse_attractions_from_response(resp_json, limit=10):
     Works across multiple response shapes.
     """
     logger.debug("Parsing attractions from API response")
-    out = []
-
-    def safe(d, *keys, default=None):
-        cur = d
-        for k in keys:
-            if isinstance(cur, dict) and k in cur:
-                cur = cur[k]
-            else:
-                return default
-        return cur
-
-    def normalize_card(card):
-        logger.debug(f"Normalizing card: {safe(card, 'cardTitle', 'string') or safe(card, 'title') or 'Unknown'}")
-        name = (
-            safe(card, "cardTitle", "string")
-            or safe(card, "title")
-            or safe(card, "name")
-            or safe(card, "localizedName")
-            or safe(card, "title", "string")
-        ) or "Unknown"
-
-        rating = safe(card, "bubbleRating", "rating") or safe(card, "rating") or "N/A"
-        reviews = safe(card, "bubbleRating", "numberReviews", "string") or safe(card, "reviewCount") or ""
-        if isinstance(reviews, str):
-            reviews = reviews.replace("(", "").replace(")", "").strip()
-
-        category = safe(card, "primaryInfo", "text") or safe(card, "category", "name") or safe(card, "category") or "N/A"
-
-        # Updated image parsing for larger images
-        photo_sizes = safe(card, "cardPhoto", "sizes") or safe(card, "photo", "sizes") or {}
-        photo = photo_sizes.get("large", {}).get("url") or photo_sizes.get("medium", {}).get("url") or photo_sizes.get("small", {}).get("url") or ""
-        if not photo:
-            url_template = safe(card, "cardPhoto", "sizes", "urlTemplate") or safe(card, "cardPhoto", "photo", "url") or safe(card, "photo", "url") or ""
-            if url_template and "{width}" in url_template:
-                photo = url_template.replace("{width}", "400").replace("{height}", "300")
-
-        route = safe(card, "cardLink", "route")
-        if isinstance(route, dict):
-            url_part = route.get("url") or route.get("nonCanonicalUrl") or ""
-            link = "https://www.tripadvisor.com" + url_part if url_part else ""
-        else:
-            link = safe(card, "detailPageUrl") or safe(card, "cardLink", "url") or ""
-
-        desc = safe(card, "descriptiveText", "text") or safe(card, "content", "description") or safe(card, "snippet") or ""
-
-        return {
-            "name": name,
-            "description": desc or "N/A",
-            "category": category,
-            "rating": rating,
-            "reviews": reviews,
-            "photo": photo,
-            "link": link,
-        }
+    if limit <= 0:
+        return []
 
+    # Card sources are lazy, so parsing stops as soon as `limit` unique cards are found
+    unique = {}
     try:
         data = resp_json.get("data", {})
-        app_list = data.get("AppPresentation_queryAppListV2") or data.get("AppPresentation_queryAppListV2", [])
-        if app_list and isinstance(app_list, list):
-            first = app_list[0] if app_list else {}
-            sections = first.get("sections") or []
-            for sec in sections:
-                if isinstance(sec, dict):
-                    items = sec.get("items") or sec.get("list", []) or sec.get("cardItems") or []
-                    if items and isinstance(items, list):
-                        for item in items:
-                            card = item.get("listSingleCardContent") or item.get("appSearchCardContent") or item
-                            out.append(normalize_card(card))
-                    else:
-                        card = sec.get("listSingleCardContent") or sec
-                        out.append(normalize_card(card))
-        if not out:
-            sections2 = data.get("sections") or data.get("results") or []
-            if isinstance(sections2, list):
-                for block in sections2:
-                    if isinstance(block, dict):
-                        items = block.get("items") or block.get("cards") or block.get("list") or []
-                        if isinstance(items, list) and items:
-                            for it in items:
-                                card = it.get("listSingleCardContent") or it.get("appSearchCardContent") or it
-                                out.append(normalize_card(card))
-                        else:
-                            card = block.get("listSingleCardContent") or block
-                            out.append(normalize_card(card))
-
-        if not out:
-            def scan_for_cards(obj):
-                if isinstance(obj, dict):
-                    if any(k in obj for k in ("cardTitle", "cardPhoto", "bubbleRating", "listSingleCardContent")):
-                        card = obj.get("listSingleCardContent") or obj
-                        out.append(normalize_card(card))
-                        return
-                    for v in obj.values():
-                        scan_for_cards(v)
-                elif isinstance(obj, list):
-                    for i in obj:
-                        scan_for_cards(i)
-            scan_for_cards(resp_json)
+        sources = (_fast_app_list_cards(data), _app_list_cards(data), _section_cards(data), _scanned_cards(resp_json))
+        for cards in sources:
+            for card in cards:
+                a = _normalize_card(card)
+                # Insertion-ordered dict dedups and keeps order in one structure
+                unique.setdefault((a["name"].strip().lower(), a["link"]), a)
+                if len(unique) >= limit:
+                    break
+            if unique:
+                break
 
     except Exception as e:
-        logger.error(f"❌ parse_attractions_from_response error: {e}")
-
-    seen = set()
-    cleaned = []
-    for a in out:
-        name = a.get("name") or ""
-        key = (name.strip().lower(), a.get("link") or "")
-        if name and key not in seen:
-            seen.add(key)
-            cleaned.append(a)
-        if len(cleaned) >= limit:
-            break
-
-    logger.info(f"✅ Parsed {len(cleaned)} unique attractions")
+        logger.error("❌ parse_attractions_from_response error: %s", e)
+
+    cleaned = list(unique.values())
+
+    logger.info("✅ Parsed %s unique attractions", len(cleaned))
     return cleaned
 
 # ======================================================
 # =============== CACHE RETRIEVAL ======================
 # ======================================================
 def get_cached_attractions(city: str):
-    logger.info(f"⚡ Retrieving cached attractions for {city}")
+    logger.info("⚡ Retrieving cached attractions for %s", city)
     cache = _load_cache(CACHE_FILE)
     attractions = cache.get(city, [])
-    logger.info(f"✅ Retrieved {len(attractions)} cached attractions for {city}")
-    return attractions
\ No newline at end of file
+    logger.info("✅ Retrieved %s cached attractions for %s", len(attractions), city)
+    return attractions
+
+def get_cached_cities():
+    """Cities that already have real (non-placeholder) attractions in the local cache."""
+    return [
+        city for city, attractions in _load_cache(CACHE_FILE).items()
+        if attractions and attractions[0].get("name") != "No attractions found"
+    ]
@@ -7,11 +7,15 @@ Uses spaCy + regex, aligned with OpenWeatherMap 5-day forecast restriction.
 import logging
 import re
 from datetime import date as date_obj, datetime, timedelta
+from functools import lru_cache
 
 import spacy
 import streamlit as st
 from spacy.cli import download
 
+from config.config import SPACY_BATCH_SIZE
+from modules.attractions_api import get_cached_cities
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,6 +28,69 @@ logging.basicConfig(
 # Create a logger for this module
 logger = logging.getLogger(__name__)
 
+# -----------------------------
+# Precompiled patterns
+# -----------------------------
+# Budget, duration and specific dates in one pass over the query. Dates come
+# first so their digits are never read as a budget; the budget branch needs a
+# keyword, "$" or the digits themselves to start a match.
+QUERY_RE = re.compile(
+    # Specific date formats (YYYY-MM-DD, MM-DD-YYYY, DD-MM-YYYY)
+    r"(?P<date>\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{4})"
+    r"|(?P<duration>\d+)\s*[- ]?(?:day|days|night|nights)"
+    # Stricter regex to match currency-related numbers only
+    r"|(?:(?:under|below|less than)\s*)?(?:\$\s*)?(?P<budget>\d{3,5})\s*(?:dollars|USD)?\b",
+    re.IGNORECASE,
+)
+
+WORD_RE = re.compile(r"[a-z]+")
+# Word forms of the relative terms extract_entities understands, mapped to the term
+RELATIVE_TERMS = {
+    "tomorrow": "tomorrow",
+    "weekend": "weekend",
+    "weekends": "weekend",
+    "week": "week",
+    "weeks": "week",
+}
+
+# Popular destinations matched directly (along with cached cities), so most
+# queries never reach spaCy.
+# Names that are also common English words (e.g. Nice, Reading) are left to NER.
+KNOWN_DESTINATIONS = (
+    "Amsterdam", "Athens", "Atlanta", "Austin", "Bangkok", "Barcelona", "Beijing",
+    "Berlin", "Boston", "Budapest", "Buenos Aires", "Cairo", "Cancun", "Cape Town",
+    "Chicago", "Copenhagen", "Dallas", "Denver", "Dubai", "Dublin", "Edinburgh",
+    "Florence", "Hawaii", "Hong Kong", "Honolulu", "Istanbul", "Kyoto", "Las Vegas",
+    "Lisbon", "London", "Los Angeles", "Madrid", "Miami", "Milan", "Montreal",
+    "Mumbai", "Munich", "Nashville", "New Orleans", "New York", "New York City",
+    "Orlando", "Paris", "Prague", "Rio de Janeiro", "Rome", "San Diego",
+    "San Francisco", "Seattle", "Seoul", "Singapore", "Sydney", "Tokyo", "Toronto",
+    "Vancouver", "Venice", "Vienna", "Washington", "Zurich",
+)
+
+
+@lru_cache(maxsize=4)
+def _destination_matcher(cached_cities: frozenset):
+    """Gazetteer regex over the known list plus every city already in the attractions cache."""
+    canonical = {c.lower(): c for c in KNOWN_DESTINATIONS}
+    known = set(canonical)
+    # Cached spellings win so the extracted name hits the attractions cache key as-is
+    canonical.update((c.strip().lower(), c) for c in cached_cities if c.strip())
+    # Known names match in any case. Cached names may be common words ("Nice",
+    # "Reading"), so they match only with the casing they have in the cache.
+    # Longest names first so "New York City" wins over "New York"
+    alternatives = (
+        f"(?i:{re.escape(c)})" if c in known else re.escape(canonical[c].strip())
+        for c in sorted(canonical, key=len, reverse=True)
+    )
+    pattern = re.compile(r"\b(" + "|".join(alternatives) + r")\b")
+    return pattern, canonical
+
+
+# Only the NER pipe is used; the rest is excluded so it is never even loaded. In
+# en_core_web_sm the ner component has its own embedded tok2vec, so the shared one can go too.
+SPACY_EXCLUDED_PIPES = ["tok2vec", "tagger", "parser", "lemmatizer", "attribute_ruler"]
+
 # -----------------------------
 # Load SpaCy model safely
 # -----------------------------
@@ -32,31 +99,41 @@ def load_spacy_model():
     """Load or download SpaCy model once per Streamlit session."""
     logger.info("⚡ Loading SpaCy model 'en_core_web_sm'")
     try:
-        nlp = spacy.load("en_core_web_sm")
+        nlp = spacy.load("en_core_web_sm", exclude=SPACY_EXCLUDED_PIPES)
         logger.info("✅ SpaCy model loaded successfully")
         return nlp
     except OSError:
         logger.warning("⚠️ SpaCy model not found, downloading 'en_core_web_sm'")
         try:
             download("en_core_web_sm")
-            nlp = spacy.load("en_core_web_sm")
+            nlp = spacy.load("en_core_web_sm", exclude=SPACY_EXCLUDED_PIPES)
             logger.info("✅ SpaCy model downloaded and loaded successfully")
             return nlp
         except Exception as e:
             logger.error(f"❌ Failed to download or load SpaCy model: {e}")
             raise
 
-nlp = load_spacy_model()
+def _current_destination_matcher():
+    """Gazetteer matcher for the attractions cache as it stands now."""
+    return _destination_matcher(frozenset(get_cached_cities()))
 
-def extract_entities(user_input):
+def _gazetteer_destination(user_input, matcher=None):
+    """Return the known or cached destination named in the query, if any."""
+    destination_re, destination_canonical = matcher or _current_destination_matcher()
+    destination_match = destination_re.search(user_input)
+    if destination_match:
+        return destination_canonical[destination_match.group(1).lower()]
+    return None
+
+def extract_entities(user_input, doc=None, destination=None):
     """
     Extract destination, date, duration, and budget from user query.
     Ensures dates are within OpenWeatherMap's 5-day forecast limit (from today).
     Returns date in YYYY-MM-DD format.
+    extract_entities_batch passes either the gazetteer match as `destination`
+    or, for queries the gazetteer missed, their spaCy `doc`.
     """
     logger.info(f"⚡ Extracting entities from query: '{user_input}'")
-    doc = nlp(user_input)
-    destination = None
     budget = None
     duration = None
     date = None
@@ -64,21 +141,38 @@ def extract_entities(user_input):
 
     # 1️⃣ Destination (city/country)
     logger.debug("Extracting destination")
-    for ent in doc.ents:
-        if ent.label_ == "GPE":
-            destination = ent.text
-            logger.info(f"✅ Destination extracted: {destination}")
-            break
+    if destination is None and doc is None:
+        destination = _gazetteer_destination(user_input)
+    if destination:
+        logger.info(f"✅ Destination matched from known list: {destination}")
+    else:
+        # Fall back to spaCy NER, loaded on first use rather than at import
+        if doc is None:
+            doc = load_spacy_model()(user_input)
+        for ent in doc.ents:
+            if ent.label_ == "GPE":
+                destination = ent.text
+                logger.info(f"✅ Destination extracted: {destination}")
+                break
     if not destination:
         logger.warning("⚠️ No destination found in query")
         destination = None
 
+    # Relative date/duration words, found by set lookup over the query's words
+    relative_terms = RELATIVE_TERMS.get
+    terms = {relative_terms(w) for w in WORD_RE.findall(user_input.lower())}
+
+    # First budget, duration and date mentions, collected in one scan
+    found = {}
+    for match in QUERY_RE.finditer(user_input):
+        found.setdefault(match.lastgroup, match.group(match.lastgroup))
+        if len(found) == 3:
+            break
+
     # 2️⃣ Budget (captures $1000, under 1200 dollars, etc.)
     logger.debug("Extracting budget")
-    # Stricter regex to match currency-related numbers only
-    budget_match = re.search(r"(?:under|below|less than)?\s*\$?\s*(\d{3,5})\s*(?:dollars|USD)?\b", user_input, re.IGNORECASE)
-    if budget_match:
-        budget = int(budget_match.group(1))
+    if "budget" in found:
+        budget = int(found["budget"])
         logger.info(f"✅ Budget extracted: ${budget}")
     else:
         logger.warning("⚠️ No budget found, setting default to $1000")
@@ -86,14 +180,13 @@ def extract_entities(user_input):
 
     # 3️⃣ Duration (e.g., 4-day, 5 nights, or 'weekend')
     logger.debug("Extracting duration")
-    duration_match = re.search(r"(\d+)\s*[- ]?(day|days|night|nights)", user_input, re.IGNORECASE)
-    if duration_match:
-        duration = int(duration_match.group(1))
+    if "duration" in found:
+        duration = int(found["duration"])
         logger.info(f"✅ Duration extracted: {duration} days")
-    elif "weekend" in user_input.lower():
+    elif "weekend" in terms:
         duration = 3  # Assume Friday to Sunday
         logger.info(f"✅ Duration extracted for 'weekend': 3 days")
-    elif "week" in user_input.lower():
+    elif "week" in terms:
         # Calculate days remaining in 5-day forecast window
         days_remaining = 5  # From today to 5 days ahead
         duration = days_remaining
@@ -104,12 +197,8 @@ def extract_entities(user_input):
 
     # 4️⃣ Date Extraction (specific dates or relative terms within 5 days)
     logger.debug("Extracting date")
-    # Specific date formats (YYYY-MM-DD, MM-DD-YYYY, DD-MM-YYYY)
-    date_regex = r"(\d{4}[-/.]\d{1,2}[-/.]\d{1,2})|(\d{1,2}[-/.]\d{1,2}[-/.]\d{4})"
-    specific_date_match = re.search(date_regex, user_input)
-
-    if specific_date_match:
-        date_str = specific_date_match.group(0)
+    if "date" in found:
+        date_str = found["date"]
         logger.debug(f"Found specific date: {date_str}")
         try:
             # Try parsing different date formats
@@ -130,11 +219,10 @@ def extract_entities(user_input):
             date = None
     else:
         # Check for relative date terms
-        user_input_lower = user_input.lower()
-        if "tomorrow" in user_input_lower:
+        if "tomorrow" in terms:
             date = (today + timedelta(days=1)).strftime('%Y-%m-%d')
             logger.info(f"✅ Relative date 'tomorrow' extracted: {date}")
-        elif "weekend" in user_input_lower:
+        elif "weekend" in terms:
             # Assume "weekend" starts on Friday
             days_to_friday = (4 - today.weekday()) % 7  # Friday is 4 in weekday (0=Mon, 6=Sun)
             if days_to_friday == 0:  # If today is Friday, use today
@@ -145,7 +233,7 @@ def extract_entities(user_input):
             else:
                 logger.warning(f"⚠️ 'Weekend' is outside 5-day forecast window, defaulting to tomorrow")
                 date = (today + timedelta(days=1)).strftime('%Y-%m-%d')
-        elif "week" in user_input_lower:
+        elif "week" in terms:
             # Assume "this week" starts from today
             date = today.strftime('%Y-%m-%d')
             logger.info(f"✅ Relative date 'this week' extracted (start from today): {date}")
@@ -162,6 +250,28 @@ def extract_entities(user_input):
     logger.info(f"✅ Extraction complete: {result}")
     return result
 
+def extract_entities_batch(queries, batch_size=SPACY_BATCH_SIZE):
+    """
+    Extract entities for many queries at once.
+    Queries the gazetteer can't resolve go through spaCy together via nlp.pipe.
+    Batching alone is the win here; n_process isn't worth it for the small model.
+    """
+    queries = list(queries)
+    # One cache read for the whole batch, and each query matched only once
+    matcher = _current_destination_matcher()
+    known = [_gazetteer_destination(q, matcher) for q in queries]
+    docs = [None] * len(queries)
+    misses = [i for i, found in enumerate(known) if not found]
+    if misses:
+        logger.info(f"⚡ Running spaCy NER on {len(misses)} of {len(queries)} queries in batches of {batch_size}")
+        parsed = load_spacy_model().pipe((queries[i] for i in misses), batch_size=batch_size)
+        for i, doc in zip(misses, parsed):
+            docs[i] = doc
+    return [
+        extract_entities(q, doc=doc, destination=found)
+        for q, doc, found in zip(queries, docs, known)
+    ]
+
 if __name__ == "__main__":
     # 🔍 Quick tests
     test_queries = [
@@ -171,6 +281,6 @@ if __name__ == "__main__":
         "Show me things to do in London this week",
         "Plan a trip to Boston in November"
     ]
-    for q in test_queries:
+    for q, result in zip(test_queries, extract_entities_batch(test_queries)):
         logger.info(f"Testing query: {q}")
-        print(extract_entities(q))
\ No newline at end of file
+        print(result)
\ No newline at end of file
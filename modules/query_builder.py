@@ -12,6 +12,9 @@ INTEREST_PATTERNS = {
     "family": r"\b(family|kids|children|theme park)\b",
     "adventure": r"\b(adventure|thrill|extreme|sport)\b",
 }
+# All interests in one pass. Each branch is a zero-width lookahead so overlapping
+# phrases ("theme park" / "park") still report every label they belong to.
+INTEREST_RE = re.compile("|".join(f"(?=(?P<{label}>{pattern}))" for label, pattern in INTEREST_PATTERNS.items()))
 
 
 def extract_interest_keywords(user_query: str) -> list[str]:
@@ -19,7 +22,8 @@ def extract_interest_keywords(user_query: str) -> list[str]:
     if not user_query:
         return []
     query_lower = user_query.lower()
-    return [label for label, pattern in INTEREST_PATTERNS.items() if re.search(pattern, query_lower)]
+    found = {match.lastgroup for match in INTEREST_RE.finditer(query_lower)}
+    return [label for label in INTEREST_PATTERNS if label in found]
 
 
 def build_retrieval_query(user_query, destination, budget, duration, date=None):
@@ -1,24 +1,37 @@
+import base64
 import hashlib
-import json
 import logging
 import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
 
 import faiss
 import numpy as np
+import orjson
 from openai import OpenAI
 
 from config.config import (
     CACHE_FILE,
     EMBEDDING_MODEL,
+    FAISS_THREADS,
     OPENAI_API_KEY,
     USE_OFFLINE_MODE,
     get_index_paths,
 )
 from modules.query_builder import build_retrieval_query
-from modules.retrieval import retrieve_attractions
+from modules.retrieval import build_bm25, retrieve_attractions
 
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+faiss.omp_set_num_threads(FAISS_THREADS)
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +42,28 @@ if not OPENAI_API_KEY:
         "OpenAI API key not found. Set OPENAI_API_KEY in your environment or .env file."
     )
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Recorded in the manifest so indexes built with an older metric or storage get rebuilt
+INDEX_METRIC = "cosine"
+INDEX_ENCODING = "sq8"
+# Output size of EMBEDDING_MODEL (text-embedding-3-small)
+EMBEDDING_DIM = 1536
+# Inputs per embeddings request (the API accepts up to 2048)
+EMBEDDING_BATCH_SIZE = 256
+# Embedding requests in flight at once; each is mostly network wait
+EMBEDDING_WORKERS = 4
+# Distinct search queries whose embeddings are kept (6 KB each)
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+# Seconds per embeddings request; the client default is ten minutes
+EMBEDDING_TIMEOUT = 20
+EMBEDDING_MAX_RETRIES = 2
+
+# One client for the process: its keep-alive pool is shared by query embeddings
+# and every concurrent build batch, so connections are set up once
+client = OpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=EMBEDDING_TIMEOUT,
+    max_retries=EMBEDDING_MAX_RETRIES,
+)
 
 CATEGORY_HINTS = {
     "museum": "culture and indoor exploration",
@@ -81,13 +115,13 @@ def _category_hints(category: str) -> str:
     return "; ".join(hints) if hints else "general sightseeing"
 
 
-def _combined_text(item, city="", budget=None, duration=None):
+def _combined_text(item, city="", tier="moderate"):
     """Build enriched document text for embedding and BM25."""
-    rating = _parse_rating(item.get("rating"))
-    reviews = _parse_reviews(item.get("reviews"))
-    category = item.get("category", "N/A")
-    description = item.get("description", "N/A")
-    tier = _budget_tier(budget, duration) if budget and duration else "moderate"
+    get = item.get
+    rating = _parse_rating(get("rating"))
+    reviews = _parse_reviews(get("reviews"))
+    category = get("category", "N/A")
+    description = get("description", "N/A")
 
     quality_parts = []
     if rating >= 4.5:
@@ -109,8 +143,8 @@ def _combined_text(item, city="", budget=None, duration=None):
     desc_part = description if description and description != "N/A" else hints
 
     return (
-        f"Name: {item.get('name', '')}. "
-        f"Category: {category}. City: {city or item.get('city', '')}. "
+        f"Name: {get('name', '')}. "
+        f"Category: {category}. City: {city or get('city', '')}. "
         f"{quality_str}. "
         f"Good for: {hints}. Budget tier: {tier}. "
         f"Description: {desc_part}."
@@ -119,50 +153,55 @@ def _combined_text(item, city="", budget=None, duration=None):
 
 def prepare_entries(attractions, city, budget=None, duration=None):
     """Normalize attraction records for embedding and indexing."""
+    # The same for every attraction in the call
+    tier = _budget_tier(budget, duration) if budget and duration else "moderate"
     entries = []
     for item in attractions:
-        entry = dict(item)
-        entry["city"] = city
-        entry["doc_id"] = _doc_id(item)
-        entry["combined_text"] = _combined_text(item, city, budget, duration)
-        entry["search_text"] = entry["combined_text"]
-        entries.append(entry)
+        text = _combined_text(item, city, tier)
+        entries.append({**item, "city": city, "doc_id": _doc_id(item), "combined_text": text, "search_text": text})
     return entries
 
 
+@lru_cache(maxsize=4)
+def _normalized_entries(data_file: str, mtime_ns: int) -> tuple:
+    """Parse and normalize a data file; memoized per (path, mtime)."""
+    with open(data_file, "rb") as f:
+        data = orjson.loads(f.read())
+
+    entries = []
+    if isinstance(data, dict):
+        for city, attractions in data.items():
+            entries.extend(prepare_entries(attractions, city))
+    elif isinstance(data, list):
+        for item in data:
+            entries.extend(prepare_entries((item,), item.get("city", "")))
+    return tuple(entries)
+
+
 def load_and_normalize_data(data_file=DATA_FILE):
     """Load attractions.json and normalize all records for embedding."""
     logger.info("Loading data from %s", data_file)
-    os.makedirs(os.path.dirname(data_file), exist_ok=True)
 
-    if not os.path.exists(data_file):
+    mtime_ns = _file_stamp(data_file)
+    if mtime_ns is None:
         logger.warning("Data file not found at %s", data_file)
         return []
 
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, OSError) as e:
+        entries = _normalized_entries(data_file, mtime_ns)
+    except (orjson.JSONDecodeError, OSError) as e:
         logger.error("Error loading data file %s: %s", data_file, e)
         return []
 
-    entries = []
-    if isinstance(data, dict):
-        for city, attractions in data.items():
-            entries.extend(prepare_entries(attractions, city))
-    elif isinstance(data, list):
-        for item in data:
-            city = item.get("city", "")
-            entries.append(prepare_entries([item], city)[0])
-
     logger.info("Loaded and normalized %s entries.", len(entries))
-    return entries
+    # Fresh dicts so callers can't mutate the memoized entries
+    return [dict(entry) for entry in entries]
 
 
 def get_embedding(text):
     """Generate an embedding for the given text."""
     if USE_OFFLINE_MODE:
-        return np.zeros(1536, dtype=np.float32)
+        return np.zeros(EMBEDDING_DIM, dtype=np.float32)
 
     try:
         response = client.embeddings.create(
@@ -175,21 +214,138 @@ def get_embedding(text):
         return None
 
 
+def _embed_batch(batch):
+    """One embeddings request; a list of Nones if it fails."""
+    try:
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+        # The API may return items out of order; place them by index
+        ordered = sorted(response.data, key=lambda d: d.index)
+        # One conversion into a (batch, dim) matrix; each text gets a row view
+        return list(np.array([d.embedding for d in ordered], dtype=np.float32))
+    except Exception as e:
+        logger.error("OpenAI embedding API error for batch of %s: %s", len(batch), e)
+        return [None] * len(batch)
+
+
+def get_embeddings(texts):
+    """Embed many texts with one request per EMBEDDING_BATCH_SIZE inputs.
+
+    Requests run concurrently, up to EMBEDDING_WORKERS at a time.
+    Returns one array per text, in order; None where its batch failed.
+    """
+    if USE_OFFLINE_MODE:
+        # One allocation for the whole batch; each text gets a row view
+        return list(np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32))
+
+    batches = [
+        texts[start:start + EMBEDDING_BATCH_SIZE]
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+    if len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=min(EMBEDDING_WORKERS, len(batches))) as ex:
+            results = list(ex.map(_embed_batch, batches))
+    else:
+        results = [_embed_batch(batch) for batch in batches]
+    return [embedding for batch in results for embedding in batch]
+
+
+class _EmbeddingUnavailable(Exception):
+    """Raised inside the query-embedding cache so failures are not memoized."""
+
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _query_embedding(text: str) -> np.ndarray:
+    embedding = get_embedding(text)
+    if embedding is None:
+        raise _EmbeddingUnavailable(text)
+    # Contiguous unit-length fp32, the layout FAISS inner-product search takes
+    # without a copy; normalized once here rather than on every search
+    embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+    faiss.normalize_L2(embedding.reshape(1, -1))
+    # Shared by every caller with the same query text
+    embedding.setflags(write=False)
+    return embedding
+
+
+def get_query_embedding(text):
+    """Unit-length embedding for a search query, memoized on the query string.
+
+    Runs of whitespace are collapsed first, so a stray or doubled space in the
+    user's text reuses the cached embedding instead of costing a request.
+    """
+    try:
+        return _query_embedding(" ".join(text.split()))
+    except _EmbeddingUnavailable:
+        return None
+
+
+def _embedding_key(text: str) -> str:
+    """Content address of a text's embedding: the model plus a hash of the text."""
+    return f"{EMBEDDING_MODEL}:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+
+
+def _encode_embedding(embedding) -> str:
+    # Raw float32 bytes: a quarter the size of a JSON float list, and no float parsing
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_embedding(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+
 def _load_embeddings_cache(paths: dict) -> dict:
     cache_path = str(paths["embeddings_cache"])
     if os.path.exists(cache_path):
         try:
-            with open(cache_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, OSError):
+            with open(cache_path, "rb") as f:
+                cache = orjson.loads(f.read())
+        except (orjson.JSONDecodeError, OSError):
             return {}
+        # Carry over entries from the old doc_id-keyed layout
+        for key, value in list(cache.items()):
+            if isinstance(value, dict):
+                del cache[key]
+                cache[f"{EMBEDDING_MODEL}:{value['text_hash']}"] = _encode_embedding(value["embedding"])
+        return cache
     return {}
 
 
+def _atomic_write(file_path, payload: bytes):
+    """Write bytes beside the live file and swap them in, so readers never see a partial file."""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, file_path)
+
+
 def _save_embeddings_cache(paths: dict, cache: dict):
     os.makedirs(paths["dir"], exist_ok=True)
-    with open(paths["embeddings_cache"], "w", encoding="utf-8") as f:
-        json.dump(cache, f)
+    _atomic_write(paths["embeddings_cache"], orjson.dumps(cache))
+
+
+def _entries_fingerprint(entries) -> str:
+    """Hash of the documents an index is built from (ids plus embedded text)."""
+    digest = hashlib.sha256()
+    for entry in entries:
+        digest.update(entry["doc_id"].encode("utf-8"))
+        digest.update(entry["combined_text"].encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _index_is_current(paths, fingerprint: str) -> bool:
+    if not (paths["index"].exists() and paths["meta"].exists()):
+        return False
+    try:
+        with open(paths["manifest"], "rb") as f:
+            manifest = orjson.loads(f.read())
+    except (orjson.JSONDecodeError, OSError):
+        return False
+    return (
+        manifest.get("entries_fingerprint") == fingerprint
+        and manifest.get("embedding_model") == EMBEDDING_MODEL
+        and manifest.get("index_metric") == INDEX_METRIC
+        and manifest.get("index_encoding") == INDEX_ENCODING
+    )
 
 
 def index_exists(city: str) -> bool:
@@ -197,31 +353,100 @@ def index_exists(city: str) -> bool:
     return paths["index"].exists() and paths["meta"].exists()
 
 
-def load_index(city: str):
-    """Load per-city FAISS index and metadata."""
-    if USE_OFFLINE_MODE:
-        return None, None, None
+def _file_stamp(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@lru_cache(maxsize=16)
+def _read_index_files(index_path: str, meta_path: str, stamp: tuple):
+    """Deserialize an index and its metadata; memoized per file mtimes."""
+    # Map the index file rather than copying it into process memory; builds
+    # whose index type can't be mapped fall back to a normal read
+    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    with open(meta_path, "rb") as f:
+        metadata = orjson.loads(f.read())
+    logger.info("Loaded FAISS index from %s with %s vectors.", index_path, index.ntotal)
+    return index, metadata
+
+
+@lru_cache(maxsize=16)
+def _read_city_bm25(index_path: str, meta_path: str, stamp: tuple):
+    """BM25 model over an index's metadata; memoized per file mtimes like the index."""
+    _, metadata = _read_index_files(index_path, meta_path, stamp)
+    return build_bm25(metadata)
 
+
+@lru_cache(maxsize=16)
+def _read_doc_ids(index_path: str, meta_path: str, stamp: tuple):
+    """Row-ordered doc_id array for an index's metadata; memoized per file mtimes."""
+    _, metadata = _read_index_files(index_path, meta_path, stamp)
+    return np.array([item.get("doc_id") for item in metadata], dtype=object)
+
+
+@lru_cache(maxsize=16)
+def _read_doc_rows(index_path: str, meta_path: str, stamp: tuple):
+    """doc_id -> row number for an index's metadata; memoized per file mtimes."""
+    doc_ids = _read_doc_ids(index_path, meta_path, stamp)
+    return {doc_id: i for i, doc_id in enumerate(doc_ids)}
+
+
+def _index_files(city: str):
+    """Paths and mtime stamp of a city's index files, or None if it has no index."""
     paths = get_index_paths(city)
     index_path = str(paths["index"])
     meta_path = str(paths["meta"])
-    emb_path = str(paths["embeddings"])
 
-    if not os.path.exists(index_path) or not os.path.exists(meta_path):
-        return None, None, None
+    stamp = (_file_stamp(index_path), _file_stamp(meta_path))
+    if None in stamp:
+        return None
+    return index_path, meta_path, stamp
+
+
+def load_index(city: str):
+    """Load per-city FAISS index and metadata (cached until the files change)."""
+    if USE_OFFLINE_MODE:
+        return None, None
+
+    files = _index_files(city)
+    if files is None:
+        return None, None
 
     try:
-        index = faiss.read_index(index_path)
-        with open(meta_path, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-        embeddings = None
-        if os.path.exists(emb_path):
-            embeddings = np.load(emb_path)
-        logger.info("Loaded FAISS index for %s with %s vectors.", city, index.ntotal)
-        return index, metadata, embeddings
+        return _read_index_files(*files)
     except Exception as e:
         logger.error("Error loading index for %s: %s", city, e)
-        return None, None, None
+        return None, None
+
+
+def _load_derived(city: str, reader, default, what: str):
+    """Run a memoized reader over a city's index files; `default` if unavailable."""
+    files = None if USE_OFFLINE_MODE else _index_files(city)
+    if files is None:
+        return default
+
+    try:
+        return reader(*files)
+    except Exception as e:
+        logger.error("Error %s for %s: %s", what, city, e)
+        return default
+
+
+def load_bm25(city: str):
+    """BM25 model over a city's indexed metadata (cached until the files change)."""
+    return _load_derived(city, _read_city_bm25, None, "building BM25")
+
+
+def load_doc_ids(city: str):
+    """Row-ordered doc_id array for a city (cached until the files change)."""
+    return _load_derived(city, _read_doc_ids, None, "collecting doc ids")
+
+
+def load_doc_rows(city: str) -> dict:
+    """doc_id -> index row for a city (cached until the files change)."""
+    return _load_derived(city, _read_doc_rows, {}, "mapping doc ids")
 
 
 def build_embeddings(entries, city: str, budget=None, duration=None):
@@ -238,28 +463,34 @@ def build_embeddings(entries, city: str, budget=None, duration=None):
     os.makedirs(paths["dir"], exist_ok=True)
     cache = _load_embeddings_cache(paths)
 
-    embeddings = []
+    # Rows are filled in place; only the first len(metadata) are kept
+    embeddings_array = np.empty((len(entries), EMBEDDING_DIM), dtype=np.float32)
     metadata = []
     logger.info("Generating embeddings for %s entries in %s...", len(entries), city)
 
-    for entry in entries:
-        doc_id = entry["doc_id"]
-        text = entry["combined_text"]
-        text_hash = hashlib.md5(text.encode("utf-8")).hexdigest()
-
-        cached = cache.get(doc_id)
-        if cached and cached.get("text_hash") == text_hash:
-            embedding = np.array(cached["embedding"], dtype=np.float32)
-        else:
-            embedding = get_embedding(text)
+    keys = [_embedding_key(e["combined_text"]) for e in entries]
+
+    # Embed each distinct uncached text once, in as few API requests as possible
+    missing = {}
+    for key, entry in zip(keys, entries):
+        if key not in cache:
+            missing.setdefault(key, entry["combined_text"])
+    fresh = {}
+    if missing:
+        for key, embedding in zip(missing, get_embeddings(list(missing.values()))):
             if embedding is not None:
-                cache[doc_id] = {
-                    "text_hash": text_hash,
-                    "embedding": embedding.tolist(),
-                }
+                fresh[key] = embedding
+                cache[key] = _encode_embedding(embedding)
+
+    for key, entry in zip(keys, entries):
+        doc_id = entry["doc_id"]
+        # Fresh vectors go straight into their row; only cache hits are decoded
+        embedding = fresh.get(key)
+        if embedding is None and key in cache:
+            embedding = _decode_embedding(cache[key])
 
         if embedding is not None:
-            embeddings.append(embedding)
+            embeddings_array[len(metadata)] = embedding
             metadata.append({
                 "doc_id": doc_id,
                 "name": entry.get("name"),
@@ -272,42 +503,108 @@ def build_embeddings(entries, city: str, budget=None, duration=None):
                 "description": entry.get("description", "N/A"),
                 "combined_text": entry.get("combined_text"),
                 "search_text": entry.get("search_text"),
+                # Lowercased once here so ranking doesn't re-lowercase per query
+                "category_lc": (entry.get("category") or "").lower(),
+                "search_text_lc": (entry.get("search_text") or entry.get("combined_text") or "").lower(),
             })
 
-    if not embeddings:
+    if not metadata:
         logger.error("No embeddings generated. Cannot build index.")
         return None, None
 
-    embeddings_array = np.vstack(embeddings)
-    index = faiss.IndexFlatL2(embeddings_array.shape[1])
+    embeddings_array = embeddings_array[:len(metadata)]
+    # Unit vectors + inner product = cosine similarity
+    faiss.normalize_L2(embeddings_array)
+    # One byte per dimension (a quarter of fp32); train() fits each dimension's
+    # range, which is all the precision ranking unit vectors needs
+    index = faiss.IndexScalarQuantizer(
+        embeddings_array.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+    )
+    index.train(embeddings_array)
     index.add(embeddings_array)
 
-    faiss.write_index(index, str(paths["index"]))
-    np.save(str(paths["embeddings"]), embeddings_array)
-    with open(paths["meta"], "w", encoding="utf-8") as f:
-        json.dump(metadata, f)
+    # Write beside the live files and swap them in: sessions may still have the
+    # old ones memory-mapped, and truncating them in place would fault their reads.
+    # Metadata goes first, so the new index never sits next to old or partial metadata.
+    _atomic_write(paths["meta"], orjson.dumps(metadata))
+    index_tmp = f"{paths['index']}.tmp"
+    faiss.write_index(index, index_tmp)
+    os.replace(index_tmp, paths["index"])
+    # The index holds the vectors; drop the separate matrix older builds wrote
+    try:
+        os.remove(paths["embeddings"])
+    except FileNotFoundError:
+        pass
 
     manifest = {
         "city": city,
         "built_at": datetime.now(timezone.utc).isoformat(),
         "attraction_count": len(metadata),
         "embedding_model": EMBEDDING_MODEL,
+        "index_metric": INDEX_METRIC,
+        "index_encoding": INDEX_ENCODING,
+        "entries_fingerprint": _entries_fingerprint(entries),
     }
-    with open(paths["manifest"], "w", encoding="utf-8") as f:
-        json.dump(manifest, f)
+    _atomic_write(paths["manifest"], orjson.dumps(manifest))
 
-    _save_embeddings_cache(paths, cache)
+    # Keep only what this build used, so removed or edited texts don't pile up
+    _save_embeddings_cache(paths, {key: cache[key] for key in keys if key in cache})
     logger.info("FAISS index built for %s with %s vectors.", city, index.ntotal)
     return index, metadata
 
 
+# One lock per city directory, shared by every Streamlit session in this process
+_build_locks = defaultdict(threading.Lock)
+
+
+@contextmanager
+def _index_build_lock(paths):
+    """Serialize builds of one city's index across sessions and processes."""
+    with _build_locks[str(paths["dir"])]:
+        os.makedirs(paths["dir"], exist_ok=True)
+        with open(paths["dir"] / ".build.lock", "w") as lock_file:
+            if fcntl is not None:
+                # Released when the file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
 def ensure_index_for_city(city: str, attractions: list, budget=None, duration=None) -> bool:
     """Build or refresh per-city index from attraction list."""
     entries = prepare_entries(attractions, city, budget, duration)
-    index, metadata = build_embeddings(entries, city, budget, duration)
+    paths = get_index_paths(city)
+    fingerprint = _entries_fingerprint(entries)
+    # Same documents as the index on disk: nothing to embed or rewrite
+    if _index_is_current(paths, fingerprint):
+        logger.info("FAISS index for %s is up to date; skipping rebuild.", city)
+        return True
+    with _index_build_lock(paths):
+        # Another session may have finished the same build while we waited
+        if _index_is_current(paths, fingerprint):
+            logger.info("FAISS index for %s was built concurrently; reusing it.", city)
+            return True
+        index, metadata = build_embeddings(entries, city, budget, duration)
     return index is not None and metadata is not None
 
 
+def _index_rank(index, query_embedding, doc_ids, rows=None) -> list[str]:
+    """doc_ids of every index row, or of only `rows`, nearest first.
+
+    The search is exhaustive: rank fusion needs a rank for every document, and
+    per-city catalogs are far too small for IVF or HNSW to pay off. A row subset
+    is filtered inside the scan, so rows outside it are never scored.
+    """
+    query = query_embedding.reshape(1, -1)
+    if rows is None:
+        _, ids = index.search(query, index.ntotal)
+    else:
+        selector = faiss.IDSelectorBatch(np.asarray(rows, dtype=np.int64))
+        _, ids = index.search(query, len(rows), params=faiss.SearchParameters(sel=selector))
+    found = ids[0]
+    # One gather through the row-ordered id array instead of a per-hit dict lookup
+    return doc_ids[found[found >= 0]].tolist()
+
+
 def search_attractions(
     query,
     destination_city,
@@ -318,35 +615,47 @@ def search_attractions(
     selected_only: list | None = None,
 ):
     """Hybrid search over per-city index."""
-    _, metadata, embeddings = load_index(destination_city)
+    index, metadata = load_index(destination_city)
     if not metadata:
         logger.error("Search failed: no index for %s", destination_city)
         return []
 
+    # Index rows to rank; None means the whole city
+    rows = None
+    bm25 = None
     if selected_only:
+        # Look the selection up instead of scanning every attraction's metadata
+        doc_rows = load_doc_rows(destination_city)
         selected_ids = {_doc_id(s) for s in selected_only}
-        filtered_meta = []
-        filtered_emb = []
-        for i, item in enumerate(metadata):
-            if item.get("doc_id") in selected_ids:
-                filtered_meta.append(item)
-                if embeddings is not None and i < len(embeddings):
-                    filtered_emb.append(embeddings[i])
-        metadata = filtered_meta
-        embeddings = np.vstack(filtered_emb) if filtered_emb else None
-
-    query_embedding = get_embedding(query)
+        rows = sorted(doc_rows[d] for d in selected_ids if d in doc_rows and doc_rows[d] < len(metadata))
+        candidates = [metadata[i] for i in rows]
+        if not candidates:
+            return []
+    else:
+        candidates = metadata
+        # Built over the whole city, so only reused when ranking all of it
+        bm25 = load_bm25(destination_city)
+
+    query_embedding = get_query_embedding(query)
     if query_embedding is None:
         return []
 
+    vector_ranking = None
+    doc_ids = load_doc_ids(destination_city)
+    if index is not None and doc_ids is not None and index.ntotal == len(metadata) == len(doc_ids):
+        # 8-bit codes are scanned in place, with no per-query fp32 copy of the matrix
+        vector_ranking = _index_rank(index, query_embedding, doc_ids, rows)
+    else:
+        logger.warning("Index for %s does not match its metadata; ranking without vectors", destination_city)
+
     return retrieve_attractions(
         query=query,
         city=destination_city,
-        candidates=metadata,
-        query_embedding=query_embedding,
-        embeddings_matrix=embeddings,
+        candidates=candidates,
         user_query=user_query or query,
         top_k=top_k,
+        vector_ranking=vector_ranking,
+        bm25=bm25,
     )
 
 
@@ -12,10 +12,13 @@ from modules.query_builder import extract_interest_keywords
 logger = logging.getLogger(__name__)
 
 RRF_K = 60
+# Links and review counts are not used by the LLM; keep prompt lines short.
+PROMPT_CATEGORY_CHARS = 40
+TOKEN_RE = re.compile(r"[a-z0-9]+")
 
 
 def _tokenize(text: str) -> list[str]:
-    return re.findall(r"[a-z0-9]+", text.lower())
+    return TOKEN_RE.findall(text.lower())
 
 
 def _parse_rating(rating) -> float:
@@ -38,8 +41,12 @@ def metadata_score(attraction: dict, interests: list[str]) -> float:
     """Score attraction quality and interest alignment from metadata."""
     rating = _parse_rating(attraction.get("rating"))
     reviews = _parse_reviews(attraction.get("reviews"))
-    category = (attraction.get("category") or "").lower()
-    search_text = (attraction.get("search_text") or attraction.get("combined_text") or "").lower()
+    category = attraction.get("category_lc")
+    if category is None:
+        category = (attraction.get("category") or "").lower()
+    search_text = attraction.get("search_text_lc")
+    if search_text is None:
+        search_text = (attraction.get("search_text") or attraction.get("combined_text") or "").lower()
 
     score = 0.0
     if rating >= 4.5:
@@ -71,35 +78,28 @@ def reciprocal_rank_fusion(rankings: list[list[str]], weights: list[float] | Non
     return scores
 
 
-def vector_rank(query_embedding: np.ndarray, embeddings: np.ndarray, doc_ids: list[str]) -> list[str]:
-    """Rank documents by cosine similarity to the query embedding."""
-    if len(doc_ids) == 0:
-        return []
-
-    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-    norms[norms == 0] = 1.0
-    normalized = embeddings / norms
-
-    query_norm = np.linalg.norm(query_embedding)
-    if query_norm == 0:
-        return doc_ids
+def build_bm25(candidates: list[dict]) -> BM25Okapi | None:
+    """BM25 model over the candidates' search text; None if none of them has any."""
+    corpus = [_tokenize(c.get("search_text") or c.get("combined_text") or c.get("name", "")) for c in candidates]
+    if not any(corpus):
+        return None
+    return BM25Okapi(corpus)
 
-    query_vec = query_embedding / query_norm
-    similarities = normalized @ query_vec
-    order = np.argsort(-similarities)
-    return [doc_ids[i] for i in order]
 
+def bm25_rank(query: str, candidates: list[dict], bm25: BM25Okapi | None = None) -> list[str]:
+    """Rank candidates using BM25 over search text.
 
-def bm25_rank(query: str, candidates: list[dict]) -> list[str]:
-    """Rank candidates using BM25 over search text."""
+    `bm25` is a model already built over exactly these candidates, in order.
+    """
     if not candidates:
         return []
 
-    corpus = [_tokenize(c.get("search_text") or c.get("combined_text") or c.get("name", "")) for c in candidates]
-    if not any(corpus):
+    # A size mismatch means the model was built from another version of the index
+    if bm25 is None or bm25.corpus_size != len(candidates):
+        bm25 = build_bm25(candidates)
+    if bm25 is None:
         return [c["doc_id"] for c in candidates]
 
-    bm25 = BM25Okapi(corpus)
     scores = bm25.get_scores(_tokenize(query))
     order = np.argsort(-scores)
     return [candidates[i]["doc_id"] for i in order]
@@ -112,7 +112,9 @@ def build_match_reason(attraction: dict, interests: list[str], score: float) ->
     if rating >= 4.5:
         parts.append("highly rated")
     if interests:
-        category = (attraction.get("category") or "").lower()
+        category = attraction.get("category_lc")
+        if category is None:
+            category = (attraction.get("category") or "").lower()
         matched = [i for i in interests if i in category]
         if matched:
             parts.append(", ".join(matched))
@@ -127,38 +129,37 @@ def retrieve_attractions(
     query: str,
     city: str,
     candidates: list[dict],
-    query_embedding: np.ndarray | None,
-    embeddings_matrix: np.ndarray | None,
     user_query: str = "",
     top_k: int = 8,
+    vector_ranking: list[str] | None = None,
+    bm25: BM25Okapi | None = None,
 ) -> list[dict]:
     """
     Hybrid retrieval over city-scoped candidates.
     Returns candidates enriched with retrieval_score and match_reason.
+    `vector_ranking` is the candidates' doc_ids nearest first, from the city's FAISS
+    index; a prebuilt `bm25` model over the candidates is reused by bm25_rank.
     """
     if not candidates:
         return []
 
     interests = extract_interest_keywords(user_query or query)
-    doc_ids = [c["doc_id"] for c in candidates]
 
     rankings = []
     weights = []
 
-    if query_embedding is not None and embeddings_matrix is not None and len(embeddings_matrix) > 0:
-        vec_ranking = vector_rank(query_embedding, embeddings_matrix, doc_ids)
-        rankings.append(vec_ranking)
+    if vector_ranking:
+        rankings.append(vector_ranking)
         weights.append(1.0)
 
-    bm25_ranking = bm25_rank(query, candidates)
+    bm25_ranking = bm25_rank(query, candidates, bm25)
     rankings.append(bm25_ranking)
     weights.append(0.8)
 
-    meta_ranking = sorted(
-        doc_ids,
-        key=lambda did: metadata_score(next(c for c in candidates if c["doc_id"] == did), interests),
-        reverse=True,
-    )
+    meta_ranking = [
+        c["doc_id"]
+        for c in sorted(candidates, key=lambda c: metadata_score(c, interests), reverse=True)
+    ]
     rankings.append(meta_ranking)
     weights.append(0.5)
 
@@ -181,17 +182,14 @@ def retrieve_attractions(
 
 
 def format_sources_for_prompt(attractions: list[dict]) -> str:
-    """Format numbered source list for LLM grounding."""
+    """Format a compact numbered source list for LLM grounding."""
     if not attractions:
         return "No retrieved attractions available."
 
     lines = []
     for i, att in enumerate(attractions, 1):
-        lines.append(
-            f"{i}. {att.get('name', 'Unknown')} | Category: {att.get('category', 'N/A')} | "
-            f"Rating: {att.get('rating', 'N/A')} | Reviews: {att.get('reviews', 'N/A')} | "
-            f"Link: {att.get('link', 'N/A')}"
-        )
+        category = (att.get("category") or "N/A")[:PROMPT_CATEGORY_CHARS]
+        lines.append(f"{i}. {att.get('name', 'Unknown')} ({att.get('rating', '?')}★, {category})")
     return "\n".join(lines)
 
 
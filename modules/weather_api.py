@@ -1,147 +1,341 @@
-import json
+import atexit
 import logging
 import os
+import threading
 import time
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from config.config import (
     OPENWEATHER_ENDPOINT,
     OPENWEATHER_ENDPOINT_CORD,
+    OPENWEATHER_ENDPOINT_CURRENT,
     OPENWEATHER_KEY,
     WEATHER_CACHE_FILE,
     WEATHER_COUNTER_FILE,
+    WEATHER_GEOCODE_CACHE_FILE,
 )
 
 logger = logging.getLogger(__name__)
 
 CACHE_TTL = 3600
+# Expired entries still serve as a fallback when the API is down or over quota,
+# but nothing older than this is worth rewriting with every save
+CACHE_KEEP_SECONDS = 86400
+# Appended to a forecast day with more than 10 mm of rain or snow
+RAIN_ALERT = " (HEAVY RAIN/SNOW WARNING - plan indoor/covered activities)"
+# date.toordinal() of 1970-01-01, to turn trip dates into Unix day numbers
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Shared default for items without a "rain"/"snow" block; never mutated
+_NO_PRECIPITATION = {}
 DAILY_LIMIT = 1000
+# OpenWeather also caps calls per minute; a token bucket refilling at that rate
+# keeps bursts (parallel forecasts, prefetches) from tripping its 429s
+MINUTE_LIMIT = 60
+_bucket = {"tokens": float(MINUTE_LIMIT), "last": time.monotonic()}
+_bucket_lock = threading.Lock()
+
+# In-memory view of WEATHER_COUNTER_FILE, loaded on first use
+_counter = None
+COUNTER_FLUSH_EVERY = 5
+_counter_lock = threading.Lock()
+
+# Serializes load-modify-save of the weather cache when forecasts run in parallel
+_cache_write_lock = threading.Lock()
+
+# Coordinates never change for a city; loaded from WEATHER_GEOCODE_CACHE_FILE on first use
+_coordinates = None
+_coordinates_lock = threading.Lock()
+
+# The counter, cache and geocode files share a directory; create it once here
+# rather than on every save
+for _weather_dir in {
+    os.path.dirname(WEATHER_COUNTER_FILE),
+    os.path.dirname(WEATHER_CACHE_FILE),
+    os.path.dirname(WEATHER_GEOCODE_CACHE_FILE),
+}:
+    os.makedirs(_weather_dir, exist_ok=True)
+
+# Connecting fails fast; the read timeouts per call still allow for slow responses
+CONNECT_TIMEOUT = 3
+
+# Shared keep-alive session: geocoding and forecast calls reuse one TLS connection
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_maxsize=8,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+    ),
+)
+
+
+@lru_cache(maxsize=4)
+def _read_json_file(file_path, mtime_ns):
+    """Parse a JSON file; memoized per (path, mtime) so unchanged files parse once."""
+    with open(file_path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def _load_json_file(file_path):
+    """Fresh copy of a JSON file's top-level dict; raises FileNotFoundError if missing."""
+    file_path = str(file_path)
+    # Callers mutate the result before saving; keep the memoized dict intact
+    return dict(_read_json_file(file_path, os.stat(file_path).st_mtime_ns))
 
 
 def _load_counter():
     today = time.strftime("%Y-%m-%d")
-    if not os.path.exists(WEATHER_COUNTER_FILE):
-        return {"date": today, "count": 0}
     try:
-        with open(WEATHER_COUNTER_FILE, "r") as f:
-            data = json.load(f)
+        data = _load_json_file(WEATHER_COUNTER_FILE)
         if data.get("date") != today:
             data = {"date": today, "count": 0}
         return data
+    except FileNotFoundError:
+        return {"date": today, "count": 0}
     except Exception as e:
         logger.error("Error loading API counter: %s", e)
         return {"date": today, "count": 0}
 
 
 def _save_counter(data):
-    os.makedirs(os.path.dirname(WEATHER_COUNTER_FILE), exist_ok=True)
     try:
-        with open(WEATHER_COUNTER_FILE, "w") as f:
-            json.dump(data, f)
+        with open(WEATHER_COUNTER_FILE, "wb") as f:
+            f.write(orjson.dumps(data))
+        _read_json_file.cache_clear()
     except Exception as e:
         logger.error("Error saving API counter: %s", e)
 
 
+def _current_counter():
+    """Today's in-memory counter; call with _counter_lock held."""
+    global _counter
+    if _counter is None:
+        _counter = _load_counter()
+    elif _counter["date"] != time.strftime("%Y-%m-%d"):
+        _counter = {"date": time.strftime("%Y-%m-%d"), "count": 0}
+    return _counter
+
+
+def _flush_counter():
+    with _counter_lock:
+        if _counter is not None:
+            _save_counter(dict(_counter))
+
+
 def _increment_counter():
-    data = _load_counter()
-    data["count"] += 1
-    _save_counter(data)
-    return data["count"]
+    """Increment the in-memory counter; persist every COUNTER_FLUSH_EVERY calls."""
+    with _counter_lock:
+        counter = _current_counter()
+        counter["count"] += 1
+        count = counter["count"]
+        if count % COUNTER_FLUSH_EVERY == 0:
+            _save_counter(dict(counter))
+    return count
+
+
+def _take_token():
+    """Spend one per-minute token; False when the bucket is empty."""
+    with _bucket_lock:
+        now = time.monotonic()
+        refill = (now - _bucket["last"]) * MINUTE_LIMIT / 60
+        _bucket["tokens"] = min(float(MINUTE_LIMIT), _bucket["tokens"] + refill)
+        _bucket["last"] = now
+        if _bucket["tokens"] < 1:
+            return False
+        _bucket["tokens"] -= 1
+        return True
 
 
 def load_counter():
-    return _load_counter()
+    with _counter_lock:
+        return dict(_current_counter())
+
+
+atexit.register(_flush_counter)
 
 
 def _load_cache():
-    if os.path.exists(WEATHER_CACHE_FILE):
-        try:
-            with open(WEATHER_CACHE_FILE, "r") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error("Error loading weather cache: %s", e)
-            return {}
-    return {}
+    try:
+        return _load_json_file(WEATHER_CACHE_FILE)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.error("Error loading weather cache: %s", e)
+        return {}
+
+
+def _atomic_write(file_path, payload: bytes):
+    """Write bytes to a temp file and swap it in, so a crash never truncates the file."""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, file_path)
+
+
+def _cache_entry(cache_key):
+    """One entry read straight from the memoized parse, without copying the whole cache."""
+    try:
+        cache = _read_json_file(str(WEATHER_CACHE_FILE), os.stat(WEATHER_CACHE_FILE).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error("Error loading weather cache: %s", e)
+        return None
+    return cache.get(cache_key)
 
 
 def _save_cache(cache):
-    os.makedirs(os.path.dirname(WEATHER_CACHE_FILE), exist_ok=True)
+    cutoff = time.time() - CACHE_KEEP_SECONDS
+    live = {key: entry for key, entry in cache.items() if entry.get("timestamp", 0) >= cutoff}
     try:
-        with open(WEATHER_CACHE_FILE, "w") as f:
-            json.dump(cache, f)
+        _atomic_write(WEATHER_CACHE_FILE, orjson.dumps(live))
+        _read_json_file.cache_clear()
     except Exception as e:
         logger.error("Error saving weather cache: %s", e)
 
 
+def _store_cache_entry(cache_key, data, timestamp, etag=None, last_modified=None):
+    """Add one entry to the cache file, re-reading it so parallel writers don't clobber each other.
+
+    etag and last_modified are the response validators used to revalidate the entry once it expires.
+    """
+    entry = {"data": data, "timestamp": timestamp}
+    if etag:
+        entry["etag"] = etag
+    if last_modified:
+        entry["last_modified"] = last_modified
+    with _cache_write_lock:
+        cache = _load_cache()
+        cache[cache_key] = entry
+        _save_cache(cache)
+
+
+def _cached_coordinates():
+    """In-memory geocode cache; call with _coordinates_lock held."""
+    global _coordinates
+    if _coordinates is None:
+        try:
+            _coordinates = _load_json_file(WEATHER_GEOCODE_CACHE_FILE)
+        except FileNotFoundError:
+            _coordinates = {}
+        except Exception as e:
+            logger.error("Error loading geocode cache: %s", e)
+            _coordinates = {}
+    return _coordinates
+
+
+class _RateLimited(Exception):
+    """The per-minute token bucket is empty; distinct from a city that can't be found."""
+
+
 def _get_coordinates(city: str):
-    """Fetch latitude and longitude for a city using OpenWeatherMap geocoding."""
-    url = f"{OPENWEATHER_ENDPOINT_CORD}?q={city}&limit=1&appid={OPENWEATHER_KEY}"
+    """Fetch latitude and longitude for a city using OpenWeatherMap geocoding.
+
+    Raises _RateLimited when a live lookup is needed but no per-minute token is left.
+    """
+    key = city.lower()
+    with _coordinates_lock:
+        cached = _cached_coordinates().get(key)
+    if cached:
+        return cached[0], cached[1]
+
+    if not _take_token():
+        logger.warning("Per-minute API limit reached; skipping geocoding for %s", city)
+        raise _RateLimited(city)
+
+    params = {"q": city, "limit": 1, "appid": OPENWEATHER_KEY}
     try:
-        response = requests.get(url, timeout=5)
+        response = _SESSION.get(OPENWEATHER_ENDPOINT_CORD, params=params, timeout=(CONNECT_TIMEOUT, 5))
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         if data:
-            return data[0]["lat"], data[0]["lon"]
+            lat, lon = data[0]["lat"], data[0]["lon"]
+            # Only successful lookups are kept, so failures are retried
+            with _coordinates_lock:
+                coordinates = _cached_coordinates()
+                coordinates[key] = [lat, lon]
+                try:
+                    _atomic_write(WEATHER_GEOCODE_CACHE_FILE, orjson.dumps(coordinates))
+                except Exception as e:
+                    logger.error("Error saving geocode cache: %s", e)
+            return lat, lon
     except requests.exceptions.RequestException as e:
         logger.error("Geocoding failed for %s: %s", city, e)
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to decode geocoding response for %s: %s", city, e)
     return None, None
 
 
 def get_weather(city: str) -> str:
     """Fetch current weather for a city with caching and rate limiting."""
-    cache = _load_cache()
+    # Same normalization as get_forecast_summary, so " Paris" and "paris" share an entry
+    city = city.strip()
     now = time.time()
     cache_key = f"current:{city.lower()}"
+    entry = _cache_entry(cache_key)
 
-    if cache_key in cache and now - cache[cache_key]["timestamp"] < CACHE_TTL:
-        return f"(cached) {cache[cache_key]['data']}"
+    if entry and now - entry["timestamp"] < CACHE_TTL:
+        return f"(cached) {entry['data']}"
 
-    counter = _load_counter()
+    counter = load_counter()
     if counter["count"] >= DAILY_LIMIT:
         return "Daily API limit reached — using cached result if available."
-
     if not OPENWEATHER_KEY:
         return "Weather service unavailable (API key missing)."
+    if not _take_token():
+        return "Weather API busy — try again in a moment."
 
     try:
-        url = (
-            f"https://api.openweathermap.org/data/2.5/weather"
-            f"?q={city}&appid={OPENWEATHER_KEY}&units=metric"
+        params = {"q": city, "appid": OPENWEATHER_KEY, "units": "metric"}
+        response = _SESSION.get(
+            OPENWEATHER_ENDPOINT_CURRENT, params=params, timeout=(CONNECT_TIMEOUT, 5)
         )
-        response = requests.get(url, timeout=5)
         _increment_counter()
 
         if response.status_code != 200:
             return f"Weather fetch error ({response.status_code})"
 
-        result = response.json()
+        result = orjson.loads(response.content)
         desc = result["weather"][0]["description"]
         temp = result["main"]["temp"]
         feels = result["main"]["feels_like"]
         weather_text = f"{desc}, {temp}°C (feels {feels}°C)"
 
-        cache[cache_key] = {"data": weather_text, "timestamp": now}
-        _save_cache(cache)
+        _store_cache_entry(cache_key, weather_text, now)
         return weather_text
     except Exception as e:
         logger.error("Weather fetch failed for %s: %s", city, e)
         return f"Weather unavailable ({e})"
 
 
+def _format_forecast_day(i, day_str, day_data):
+    avg_temp = day_data["temp_sum"] / day_data["temp_count"]
+    # Most frequent conditions first; a set gave a different order per process
+    main_desc = ", ".join(desc for desc, _ in day_data["descriptions"].most_common())
+    rain_alert = RAIN_ALERT if day_data["rain_sum"] > 10 else ""
+    # OpenWeather descriptions are lowercase; only the first letter needs raising
+    return (
+        f"Day {i + 1} ({day_str}): Avg Temp {int(avg_temp)}°C. "
+        f"Conditions: {main_desc[:1].upper()}{main_desc[1:]}{rain_alert}."
+    )
+
+
 def get_forecast_summary(city_name, start_date_str, duration_days):
     """Fetch the 5-day forecast and return a summarized daily report."""
-    lat, lon = _get_coordinates(city_name.strip())
-    if lat is None or lon is None:
-        return "Weather data unavailable: Could not find city coordinates."
-
+    # Cheap checks and the cache come first; geocoding may cost a network call
     if not OPENWEATHER_KEY:
         logger.error("OPENWEATHER_KEY is missing.")
         return "Weather service unavailable (API key missing)."
 
     try:
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+        start_date = date.fromisoformat(start_date_str)
     except ValueError:
         logger.error("Invalid date format: %s", start_date_str)
         return "Weather service unavailable (invalid start date)."
@@ -151,80 +345,110 @@ def get_forecast_summary(city_name, start_date_str, duration_days):
         return "Weather service unavailable (no city provided)."
 
     cache_key = f"{city.lower()}-{start_date_str}-{duration_days}"
-    cache = _load_cache()
+    entry = _cache_entry(cache_key)
     now = time.time()
 
-    if cache_key in cache and (now - cache[cache_key]["timestamp"]) < CACHE_TTL:
+    if entry and (now - entry["timestamp"]) < CACHE_TTL:
         logger.info("Cache hit for weather forecast: %s", city)
-        return cache[cache_key]["data"]
+        return entry["data"]
 
-    counter = _load_counter()
+    busy = "Weather data is currently unavailable (API busy, try again shortly)."
+    try:
+        lat, lon = _get_coordinates(city)
+    except _RateLimited:
+        return (entry or {}).get("data", busy)
+    if lat is None or lon is None:
+        return "Weather data unavailable: Could not find city coordinates."
+
+    counter = load_counter()
     if counter["count"] >= DAILY_LIMIT:
         logger.warning("Daily API limit reached: %s/%s", counter["count"], DAILY_LIMIT)
-        return cache.get(cache_key, {}).get(
+        return (entry or {}).get(
             "data", "Weather data is currently unavailable (API limit reached)."
         )
+    if not _take_token():
+        logger.warning("Per-minute API limit reached for forecast: %s", city)
+        return (entry or {}).get("data", busy)
 
     try:
-        url = f"{OPENWEATHER_ENDPOINT}?lat={lat}&lon={lon}&appid={OPENWEATHER_KEY}&units=metric"
+        params = {"lat": lat, "lon": lon, "appid": OPENWEATHER_KEY, "units": "metric"}
         logger.info("Calling OpenWeatherMap forecast API for %s", city)
-        response = requests.get(url, timeout=10)
+        # Revalidate an expired entry: a 304 has no body to download or parse
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response = _SESSION.get(
+            OPENWEATHER_ENDPOINT, params=params, headers=headers, timeout=(CONNECT_TIMEOUT, 10)
+        )
+
+        if response.status_code == 304 and entry:
+            _increment_counter()
+            logger.info("Forecast not modified for %s; refreshing cache entry", city)
+            _store_cache_entry(
+                cache_key, entry["data"], now, entry.get("etag"), entry.get("last_modified")
+            )
+            return entry["data"]
 
         if response.status_code != 200:
             logger.error("OpenWeather API error: %s", response.status_code)
-            return cache.get(cache_key, {}).get(
+            return (entry or {}).get(
                 "data", f"Weather forecast failed (status {response.status_code})."
             )
 
         _increment_counter()
-        data = response.json()
+        data = orjson.loads(response.content)
     except requests.exceptions.Timeout:
         logger.error("OpenWeather API request timeout.")
-        return cache.get(cache_key, {}).get("data", "Weather forecast failed (timeout).")
+        return (entry or {}).get("data", "Weather forecast failed (timeout).")
     except requests.exceptions.RequestException as e:
         logger.error("OpenWeather API network error: %s", e)
-        return cache.get(cache_key, {}).get("data", "Weather forecast failed (network error).")
-    except json.JSONDecodeError as e:
+        return (entry or {}).get("data", "Weather forecast failed (network error).")
+    except orjson.JSONDecodeError as e:
         logger.error("Failed to decode OpenWeather response: %s", e)
-        return cache.get(cache_key, {}).get("data", "Weather forecast failed (invalid response).")
+        return (entry or {}).get("data", "Weather forecast failed (invalid response).")
 
     forecast_list = data.get("list", [])
     if not forecast_list:
         return "Weather forecast is currently unavailable for this period."
 
     daily_weather = {}
-    end_date = start_date + timedelta(days=duration_days - 1)
+    # Timestamps are UTC; shifted by the city's UTC offset, one integer division
+    # gives the destination's calendar day (the server's own timezone is irrelevant)
+    utc_offset = data.get("city", {}).get("timezone", 0)
+    start_day = start_date.toordinal() - EPOCH_ORDINAL
+    day_strs = [(start_date + timedelta(days=i)).isoformat() for i in range(duration_days)]
     for item in forecast_list:
-        dt_obj = datetime.fromtimestamp(item["dt"]).date()
-        if start_date <= dt_obj <= end_date:
-            day_str = dt_obj.strftime("%Y-%m-%d")
-            if day_str not in daily_weather:
-                daily_weather[day_str] = {"temps": [], "descriptions": set(), "rain_sum": 0}
-
-            daily_weather[day_str]["temps"].append(item["main"]["temp"])
-            daily_weather[day_str]["descriptions"].add(item["weather"][0]["description"])
-            if "rain" in item and "3h" in item["rain"]:
-                daily_weather[day_str]["rain_sum"] += item["rain"]["3h"]
-            if "snow" in item and "3h" in item["snow"]:
-                daily_weather[day_str]["rain_sum"] += item["snow"]["3h"]
-
-    weather_lines = []
-    for i, day_str in enumerate(sorted(daily_weather.keys())):
-        day_data = daily_weather[day_str]
-        avg_temp = sum(day_data["temps"]) / len(day_data["temps"]) if day_data["temps"] else 0
-        main_desc = ", ".join(day_data["descriptions"])
-        rain_alert = ""
-        if day_data["rain_sum"] > 10:
-            rain_alert = " (HEAVY RAIN/SNOW WARNING - plan indoor/covered activities)"
-
-        weather_lines.append(
-            f"Day {i + 1} ({day_str}): Avg Temp {int(avg_temp)}°C. "
-            f"Conditions: {main_desc.capitalize()}{rain_alert}."
-        )
+        day_index = (item["dt"] + utc_offset) // 86400 - start_day
+        if 0 <= day_index < duration_days:
+            day_str = day_strs[day_index]
+            day_data = daily_weather.get(day_str)
+            if day_data is None:
+                day_data = daily_weather[day_str] = {
+                    "temp_sum": 0.0, "temp_count": 0, "descriptions": Counter(), "rain_sum": 0,
+                }
+
+            # Running totals, so each day's mean needs no second pass
+            day_data["temp_sum"] += item["main"]["temp"]
+            day_data["temp_count"] += 1
+            day_data["descriptions"][item["weather"][0]["description"]] += 1
+            day_data["rain_sum"] += (
+                item.get("rain", _NO_PRECIPITATION).get("3h", 0)
+                + item.get("snow", _NO_PRECIPITATION).get("3h", 0)
+            )
 
-    weather_summary = "\n".join(weather_lines)
-    cache[cache_key] = {"data": weather_summary, "timestamp": now}
-    _save_cache(cache)
+    weather_summary = "\n".join(
+        _format_forecast_day(i, day_str, daily_weather[day_str])
+        for i, day_str in enumerate(sorted(daily_weather))
+    )
+    _store_cache_entry(
+        cache_key,
+        weather_summary,
+        now,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+    )
     return weather_summary
 
 
@@ -8,7 +8,7 @@ import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from modules.attractions_api import fetch_attractions
+from modules.attractions_api import fetch_attractions_many
 from modules.query_builder import build_retrieval_query
 from modules.rag_engine import ensure_index_for_city, retrieve_for_trip
 
@@ -48,6 +48,9 @@ def run_eval(eval_path: str, top_k: int = 8, rebuild: bool = False):
 
     totals = {"recall": 0.0, "mrr": 0.0, "count": 0}
 
+    # Network-bound, so fetch every city up front in parallel
+    fetched = fetch_attractions_many(case["city"] for case in cases) if rebuild else {}
+
     for case in cases:
         city = case["city"]
         query = case["query"]
@@ -59,7 +62,7 @@ def run_eval(eval_path: str, top_k: int = 8, rebuild: bool = False):
         print(f"Query: {query}")
 
         if rebuild:
-            attractions = fetch_attractions(city)
+            attractions = fetched.get(city)
             if not attractions:
                 print(f"  Skipping {city}: no attractions")
                 continue
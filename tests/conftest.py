@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Same import root the Streamlit pages set up for themselves
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("streamlit")
+lookups = pytest.importorskip("app.components.lookups")
+
+TRIP = ("museums and food", "Paris", 1500, 3, "2025-06-01")
+
+
+@pytest.fixture(autouse=True)
+def clear_ranking_cache():
+    lookups._ranking_if_ok.clear()
+    yield
+    lookups._ranking_if_ok.clear()
+
+
+def _retrieval_returning(*results):
+    calls = []
+
+    def fake_retrieve_for_trip(**kwargs):
+        calls.append(kwargs)
+        result = results[len(calls) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return fake_retrieve_for_trip, calls
+
+
+def test_empty_ranking_is_not_cached(monkeypatch):
+    ranked = [{"name": "Louvre"}]
+    fake, calls = _retrieval_returning([], ranked)
+    monkeypatch.setattr(lookups, "retrieve_for_trip", fake)
+
+    assert lookups.cached_ranking(*TRIP) == []
+    assert lookups.cached_ranking(*TRIP) == ranked
+    assert len(calls) == 2
+
+
+def test_failed_ranking_is_not_cached(monkeypatch):
+    ranked = [{"name": "Louvre"}]
+    fake, calls = _retrieval_returning(RuntimeError("embeddings down"), ranked)
+    monkeypatch.setattr(lookups, "retrieve_for_trip", fake)
+
+    assert lookups.cached_ranking(*TRIP) == []
+    assert lookups.cached_ranking(*TRIP) == ranked
+    assert len(calls) == 2
+
+
+def test_successful_ranking_is_cached(monkeypatch):
+    ranked = [{"name": "Louvre"}]
+    fake, calls = _retrieval_returning(ranked)
+    monkeypatch.setattr(lookups, "retrieve_for_trip", fake)
+
+    assert lookups.cached_ranking(*TRIP) == ranked
+    assert lookups.cached_ranking(*TRIP) == ranked
+    assert len(calls) == 1
@@ -0,0 +1,15 @@
+from app.components.text import strip_markdown
+
+
+def test_strips_line_markers_and_emphasis():
+    notes = "## Weather\n> Pack an **umbrella** for *Day 2* and bring `cash`."
+    assert strip_markdown(notes) == "Weather\nPack an umbrella for Day 2 and bring cash."
+
+
+def test_keeps_hashes_and_angle_brackets_in_text():
+    notes = "Visit the #1 rated museum, then Gate #4; tickets > $500 are refundable."
+    assert strip_markdown(notes) == notes
+
+
+def test_keeps_unpaired_asterisk():
+    assert strip_markdown("Prices marked * include tax.") == "Prices marked * include tax."